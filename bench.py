@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the tag generator.
+
+Builds a synthetic Shopify product export (product rows with realistic HTML
+bodies, followed by their variant and image rows, spread over the
+TYPE_MAPPING types), then times each stage of the pipeline on it: CSV
+parse, strip_html, every extract_* function, determine_family_from_content,
+generate_tags_for_product, CSV write and a full process_csv run. Results can
+be saved as JSON and compared against an earlier run to catch regressions.
+
+Usage:
+    python bench.py [--rows 10k|100k|1M] [--json results.json] [--compare baseline.json]
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from generate_tags import (
+    KNOWN_BRANDS,
+    RULESET_VERSION,
+    TYPE_MAPPING,
+    determine_family_from_content,
+    extract_brand,
+    extract_bundle,
+    extract_capacity,
+    extract_joint_details,
+    extract_length,
+    extract_materials_from_spec,
+    extract_styles,
+    generate_tags_for_product,
+    process_csv,
+    strip_html,
+)
+
+FIELDNAMES = [
+    'Handle', 'Title', 'Body (HTML)', 'Vendor', 'Type', 'Tags', 'Published',
+    'Option1 Name', 'Option1 Value', 'Variant SKU', 'Variant Price',
+    'Image Src', 'Image Position',
+]
+
+PRODUCT_NOUNS = [
+    'Dab Rig', 'Recycler Rig', 'Beaker Bong', 'Water Pipe', 'Bubbler', 'Hand Pipe',
+    'Spoon Pipe', 'Chillum', 'One Hitter', 'Nectar Collector', 'Quartz Banger',
+    'Carb Cap', 'Flower Bowl', 'Dab Tool', 'Grinder', 'Rolling Tray', 'Rolling Papers',
+    'Cones', 'Torch', 'Ash Catcher', 'Downstem', 'Drop Down', 'Storage Jar',
+    'Battery', 'Coil', 'Pendant', 'Ashtray', 'Cleaner', 'Matches', 'Display Box',
+]
+
+TITLE_MODIFIERS = [
+    '14mm', '14 Male', '18 Female', '10mm', '19mm', '45 Degree', '90°', '7 Inch', '10"',
+    "12''", '5ml', '2 oz', '12 Pack', '3 pcs', 'Display 24', '100 Pack', 'Heady', 'Collab',
+    'Mini', 'Travel', 'Pocket', 'Silicone', 'Glass', 'Borosilicate', 'Titanium', 'Ceramic',
+    'Wood', 'Dragon', 'Octopus', 'Skull', 'Color Fume', 'Clear', 'Gold', 'USA',
+]
+
+SPEC_VALUES = {
+    'Material': ['Borosilicate Glass', 'Glass', 'Quartz', 'Silicone', 'Titanium',
+                 'Ceramic', 'Wood', 'Aluminum'],
+    'Joint Size': ['10mm', '14mm', '18mm', '19mm'],
+    'Joint Gender': ['Male', 'Female'],
+    'Joint Angle': ['45&deg;', '90&deg;', '90 Degree'],
+    'Height': ['5&quot;', '7 inch', '10 inch', '14 inch'],
+    'Origin': ['Made in USA', 'Made in Spokane, WA', 'Crafted in Portland', 'Imported'],
+    'Category': ['Heady Glass', 'Scientific Glass', 'Accessories'],
+}
+
+SENTENCES = [
+    'This piece is built for everyday sessions &amp; easy cleaning.',
+    'Each one is hand-crafted in small batches, so no two are exactly alike.',
+    'A wide base keeps it steady on any surface.',
+    'Pairs well with a carb cap that fits most bangers.',
+    'Perfect for travel, it fits in a pocket or a backpack.',
+    'The artist collab series features one of a kind color work.',
+    'Ships discreetly in protective packaging.',
+    'Great for dabbing concentrates or for use as a hand pipe.',
+    'Thick walls and a reinforced joint stand up to daily use.',
+    'Rinse with warm water and a glass cleaner after every few uses.',
+]
+
+
+def parse_count(value: str) -> int:
+    """Parse row counts such as 10000, 10k or 1M."""
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def synthetic_title(rng: random.Random, brands: List[str]) -> str:
+    words = []
+    if rng.random() < 0.5:
+        words.append(rng.choice(brands).title())
+    words.extend(rng.sample(TITLE_MODIFIERS, rng.randint(0, 3)))
+    words.append(rng.choice(PRODUCT_NOUNS))
+    if rng.random() < 0.2:
+        words.append(rng.choice(TITLE_MODIFIERS))
+    return ' '.join(words)
+
+
+def synthetic_body(rng: random.Random) -> str:
+    """An HTML description: paragraphs, a spec table and now and then a long one."""
+    parts = [f"<p>{' '.join(rng.sample(SENTENCES, rng.randint(1, 4)))}</p>"]
+    if rng.random() < 0.3:
+        items = ''.join(f'<li>{sentence}</li>' for sentence in rng.sample(SENTENCES, 3))
+        parts.append(f'<ul>\n  {items}\n</ul>')
+    if rng.random() < 0.8:
+        rows = ''.join(
+            f'<tr>\n    <td><strong>{label}:</strong></td>\n    <td>{rng.choice(values)}</td>\n  </tr>'
+            for label, values in rng.sample(sorted(SPEC_VALUES.items()), rng.randint(2, 5))
+        )
+        parts.append(f'<table style="width: 100%;">\n  <tbody>{rows}</tbody>\n</table>')
+    body = '\n'.join(parts)
+    # Some descriptions run to tens of KB of pasted tables and copy
+    if rng.random() < 0.05:
+        body = '\n'.join([body] * rng.randint(10, 40))
+    return body
+
+
+def generate_catalog(path: str, rows: int, seed: int = 0) -> Dict[str, int]:
+    """Write a synthetic Shopify export of about `rows` rows to `path`."""
+    rng = random.Random(seed)
+    brands = sorted(KNOWN_BRANDS)
+    types = sorted(TYPE_MAPPING) + ['', 'Misc']
+    counts = {'rows': 0, 'products': 0}
+
+    with open(path, 'w', encoding='utf-8', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        while counts['rows'] < rows:
+            counts['products'] += 1
+            slug = f"product-{counts['products']}"
+            variants = rng.choice([1, 1, 1, 2, 3, 4])
+            images = rng.randint(0, 3)
+            writer.writerow({
+                'Handle': slug,
+                'Title': synthetic_title(rng, brands),
+                'Body (HTML)': synthetic_body(rng),
+                'Vendor': 'What You Need' if rng.random() < 0.9 else 'Other Supplier',
+                'Type': rng.choice(types).title(),
+                'Tags': 'old-tag, another-tag',
+                'Published': 'TRUE',
+                'Option1 Name': 'Title' if variants == 1 else 'Color',
+                'Option1 Value': 'Default Title' if variants == 1 else 'Clear',
+                'Variant SKU': f'{slug}-1',
+                'Variant Price': f'{rng.randint(5, 400)}.99',
+                'Image Src': f'https://cdn.example.com/{slug}-1.jpg',
+                'Image Position': '1',
+            })
+            counts['rows'] += 1
+            for number in range(2, variants + 1):
+                writer.writerow({'Handle': slug, 'Option1 Value': f'Color {number}',
+                                 'Variant SKU': f'{slug}-{number}',
+                                 'Variant Price': f'{rng.randint(5, 400)}.99'})
+                counts['rows'] += 1
+            for number in range(2, images + 2):
+                writer.writerow({'Handle': slug,
+                                 'Image Src': f'https://cdn.example.com/{slug}-{number}.jpg',
+                                 'Image Position': str(number)})
+                counts['rows'] += 1
+    return counts
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process so far, in KB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB everywhere else
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def time_stage(name: str, items: int, func: Callable[[], object]) -> Dict:
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    return {
+        'stage': name,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'items_per_sec': round(items / seconds, 1) if seconds else None,
+        'us_per_item': round(seconds / items * 1e6, 3) if items else None,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def run_stages(catalog: str, sample: int, workdir: str) -> List[Dict]:
+    """Time every stage on `catalog`, keeping at most `sample` products in memory."""
+    stages = []
+    kept_rows = []
+
+    def parse():
+        kept_products = 0
+        with open(catalog, encoding='utf-8', newline='') as handle:
+            for row in csv.DictReader(handle):
+                if kept_products < sample:
+                    kept_rows.append(row)
+                    kept_products += bool(row.get('Title') and row.get('Handle'))
+
+    with open(catalog, encoding='utf-8', newline='') as handle:
+        row_count = sum(1 for _ in csv.reader(handle)) - 1
+    stages.append(time_stage('csv_parse', row_count, parse))
+
+    products = [row for row in kept_rows if row.get('Title') and row.get('Handle')]
+    titles = [row['Title'].strip() for row in products]
+    htmls = [row['Body (HTML)'] for row in products]
+    types = [row['Type'].strip() for row in products]
+    bodies = []
+    count = len(products)
+
+    stages.append(time_stage('strip_html', count, lambda: bodies.extend(map(strip_html, htmls))))
+
+    title_only = [
+        ('extract_brand', extract_brand),
+        ('extract_length', extract_length),
+        ('extract_capacity', extract_capacity),
+        ('extract_bundle', extract_bundle),
+    ]
+    for name, func in title_only:
+        stages.append(time_stage(name, count, lambda func=func: [func(t) for t in titles]))
+
+    stages.append(time_stage('extract_materials_from_spec', count, lambda: [
+        extract_materials_from_spec(t, b) for t, b in zip(titles, bodies)]))
+    stages.append(time_stage('extract_joint_details', count, lambda: [
+        extract_joint_details(t, b) for t, b in zip(titles, bodies)]))
+    stages.append(time_stage('extract_styles', count, lambda: [
+        extract_styles(t, b, p) for t, b, p in zip(titles, bodies, types)]))
+    stages.append(time_stage('determine_family_from_content', count, lambda: [
+        determine_family_from_content(t, b, p) for t, b, p in zip(titles, bodies, types)]))
+    stages.append(time_stage('generate_tags_for_product', count, lambda: [
+        generate_tags_for_product(row['Handle'], row['Title'], row['Body (HTML)'], row['Type'],
+                                  row['Vendor'], row['Tags'])
+        for row in products]))
+
+    def write():
+        with open(os.path.join(workdir, 'write.csv'), 'w', encoding='utf-8', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(kept_rows)
+
+    stages.append(time_stage('csv_write', len(kept_rows), write))
+
+    def end_to_end():
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_csv(catalog, os.path.join(workdir, 'tagged.csv'))
+
+    stages.append(time_stage('process_csv', row_count, end_to_end))
+    return stages
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print per-stage throughput against a baseline; return regressed stages."""
+    previous = {stage['stage']: stage for stage in baseline.get('stages', [])}
+    regressions = []
+    print(f"\nAgainst {baseline.get('label') or 'baseline'} ({baseline.get('rows')} rows):")
+    for stage in results['stages']:
+        old = previous.get(stage['stage'])
+        if not old or not old.get('items_per_sec') or not stage['items_per_sec']:
+            continue
+        change = stage['items_per_sec'] / old['items_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(stage['stage'])
+        print(f"  {stage['stage']:<30} {old['items_per_sec']:>12,.0f} -> "
+              f"{stage['items_per_sec']:>12,.0f} /s  {change:+7.1%}{flag}")
+    return regressions
+
+
+def print_results(results: Dict):
+    print(f"{results['rows']} rows, {results['products']} products, "
+          f"{results['catalog_bytes'] / 1e6:.1f} MB catalog")
+    print(f"  {'stage':<30} {'items':>9} {'items/s':>12} {'us/item':>10} {'peak RSS':>10}")
+    for stage in results['stages']:
+        print(f"  {stage['stage']:<30} {stage['items']:>9} {stage['items_per_sec'] or 0:>12,.0f} "
+              f"{stage['us_per_item'] or 0:>10.2f} {stage['peak_rss_kb'] / 1024:>8.1f}MB")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', default='10k',
+                        help='catalog size in CSV rows, e.g. 10k, 100k or 1M (default: 10k)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample', type=int, default=20000,
+                        help='products kept in memory for the per-function stages')
+    parser.add_argument('--catalog', metavar='PATH',
+                        help='benchmark this CSV instead of generating one')
+    parser.add_argument('--keep-catalog', metavar='PATH',
+                        help='also save the generated catalog here')
+    parser.add_argument('--label', help='name for this run in the JSON output')
+    parser.add_argument('--json', metavar='PATH', help='save the results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved JSON run')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='slowdown that counts as a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='tag-bench-')
+    try:
+        catalog = args.catalog
+        if catalog:
+            with open(catalog, encoding='utf-8', newline='') as handle:
+                counts = {'rows': 0, 'products': 0}
+                for row in csv.DictReader(handle):
+                    counts['rows'] += 1
+                    counts['products'] += bool(row.get('Title') and row.get('Handle'))
+        else:
+            catalog = os.path.join(workdir, 'catalog.csv')
+            counts = generate_catalog(catalog, parse_count(args.rows), args.seed)
+            if args.keep_catalog:
+                shutil.copyfile(catalog, args.keep_catalog)
+
+        results = {
+            'label': args.label,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'ruleset_version': RULESET_VERSION,
+            'seed': None if args.catalog else args.seed,
+            'rows': counts['rows'],
+            'products': counts['products'],
+            'catalog_bytes': os.path.getsize(catalog),
+            'stages': run_stages(catalog, args.sample, workdir),
+        }
+        results['peak_rss_kb'] = peak_rss_kb()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+        print(f"\nResults written to: {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            regressions = compare(results, json.load(handle), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than the baseline by more than "
+                  f"{args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
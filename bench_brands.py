@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the compiled brand index.
+
+Checks that BrandIndex gives exactly the same answer as the original
+"sort aliases by length and scan one by one" lookup on a fixture set of
+titles, then times both. A second round repeats the comparison with a
+large synthetic alias table to show how each approach scales.
+
+Usage:
+    python bench_brands.py [--aliases 5000] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List, Optional
+
+from generate_tags import KNOWN_BRANDS
+from tag_rules import BrandIndex
+
+FIXTURE_TITLES = [
+    '13 INCH HIGHWAY COLOR FUME ACCENT TWIN TURBO RATCHET',
+    'ZIG ZAG ROSE CONES CARTON 3 Pack',
+    'RAW Classic King Size Slim Papers 50 Pack',
+    'Raw Black Organic Hemp Cones 1 1/4',
+    'MAVEN PRIME TORCH DISPLAY 9 Pack',
+    'EO VAPE THE BAKER ELECTRONIC NECTAR COLLECTOR',
+    '14 MALE 90 DEGREE COMPETITION BANGER',
+    '7 INCH COLOR FUME HORN WAFFLE RIG',
+    'MIYAGI PAINTS ROUND SESH SCEPTOR DAB TOOL',
+    '10 INCH KERBY BOWMAN COLLAB MECH BURD RIG',
+    'Cookies Flowerbowl Bong',
+    'Lookah Seahorse Pro Plus',
+    'Puffco Peak Pro Travel Case',
+    'G Pen Dash Vaporizer',
+    'Gpen Micro+ Battery',
+    '710 SCI Quartz Banger 14mm',
+    '710sci 18mm Slurper Set',
+    'Empire Glassworks Pickle Rick Bubbler',
+    'MJ Arsenal Apollo Mini Rig',
+    'Ooze Slim Twist Pro Battery',
+    'Higher Standards Heavy Duty Grinder',
+    'Juicy Jays Jumbo 24 Pack',
+    'Juicy Jay Hemp Wraps',
+    'King Palm Slim Rolls 5 Pack',
+    'Clipper Lighter Display 48 ct',
+    'BIC Classic Lighter',
+    'Blazer Big Shot Torch',
+    'Special Blue Triple Torch',
+    'Newport Zero Butane',
+    'Santa Cruz Shredder Medium 4 Piece',
+    'Space Case Titanium Grinder',
+    'Sharpstone 2.5" Hard Top Grinder',
+    'Cali Crusher OG Pocket',
+    'Kannastor GR8TR Jar Body',
+    'OTTO by Banana Bros',
+    'OCB Virgin Papers',
+    "Randy's Wired Hemp Papers",
+    'Randys Classic Black',
+    'Dab Nation Carb Cap',
+    'Scorch Torch 61593',
+    'Vibes Ultra Thin 1.25',
+    'Elements Red Rice Papers',
+    'Only Quartz Terp Slurper',
+    'Monark Sidecar Rig',
+    'Peaselburg Freezable Coil',
+    'Pulsar APX Wax',
+    'Grav Labs Helix',
+    'Famous X Bubble Tray',
+    'High Hemp Organic Wraps',
+    'Zico Shine Papers',
+    'Shine 24K Gold Cones',
+    'Blazy Susan Pink Papers',
+    'Job 1.5 Papers',
+    'Drawer Rolling Tray',
+    'Strawberry Glass Bowl 14mm',
+    'Elemental Clear Beaker',
+    'Original Tool Kit',
+    '',
+]
+
+
+def reference_extract_brand(title: str, aliases: Dict[str, str]) -> Optional[str]:
+    """The original per-call sort and linear substring scan."""
+    title_lower = f" {title.lower()} "
+    sorted_brands = sorted(aliases.keys(), key=len, reverse=True)
+    for brand_name in sorted_brands:
+        if brand_name in title_lower:
+            return aliases[brand_name]
+    return None
+
+
+def synthetic_aliases(count: int, rng: random.Random) -> Dict[str, str]:
+    """Known brands plus `count` made-up multi-word aliases."""
+    syllables = ['ka', 'lo', 'mi', 'ra', 'zen', 'tor', 'vex', 'qua', 'bo', 'lin', 'dar', 'sol']
+    aliases = dict(KNOWN_BRANDS)
+    while len(aliases) < len(KNOWN_BRANDS) + count:
+        words = [''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+                 for _ in range(rng.randint(1, 3))]
+        alias = ' '.join(words)
+        aliases.setdefault(alias, 'brand:' + '-'.join(words))
+    return aliases
+
+
+def time_lookup(func, titles: List[str], repeat: int) -> float:
+    """Best per-title time in microseconds over `repeat` passes."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for title in titles:
+            func(title)
+        best = min(best, time.perf_counter() - start)
+    return best / len(titles) * 1e6
+
+
+def compare(label: str, aliases: Dict[str, str], titles: List[str], repeat: int):
+    index = BrandIndex(aliases)
+
+    def indexed(title):
+        return index.find(f" {title.lower()} ")
+
+    def reference(title):
+        return reference_extract_brand(title, aliases)
+
+    mismatches = [t for t in titles if indexed(t) != reference(t)]
+    if mismatches:
+        raise SystemExit(f"{label}: {len(mismatches)} mismatches, e.g. {mismatches[0]!r}")
+
+    ref_us = time_lookup(reference, titles, repeat)
+    idx_us = time_lookup(indexed, titles, repeat)
+    print(f"{label}: {len(aliases)} aliases, {len(titles)} titles, outputs identical")
+    print(f"  linear scan : {ref_us:8.2f} us/title")
+    print(f"  brand index : {idx_us:8.2f} us/title  ({ref_us / idx_us:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--aliases', type=int, default=5000,
+                        help='synthetic aliases to add for the scaling round')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    # Shuffle words between fixture titles so brands land in new positions
+    words = ' '.join(FIXTURE_TITLES).split()
+    titles = list(FIXTURE_TITLES)
+    titles += [' '.join(rng.choice(words) for _ in range(rng.randint(2, 9))) for _ in range(2000)]
+    compare('known brands', KNOWN_BRANDS, titles, args.repeat)
+
+    aliases = synthetic_aliases(args.aliases, rng)
+    alias_words = ' '.join(aliases).split()
+    scaled_titles = titles[:500] + [
+        ' '.join(rng.choice(alias_words + words) for _ in range(rng.randint(2, 9)))
+        for _ in range(500)
+    ]
+    compare('synthetic brands', aliases, scaled_titles, max(1, args.repeat // 2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Offline preview of the spec's Shopify smart collections.
+
+The spec defines every collection as "Product tag equals" conditions: a
+product is in when it carries any of the include tags and none of the
+exclude tags. This builds an inverted index from each tag to a bitmap of
+products (a Python int, bit i = product i) from a tagged output file, then
+evaluates every collection with a few big-int ORs, ANDs and popcounts.
+Comparing two tagged outputs shows how a rule change moves products in
+and out of each collection before anything is pushed to Shopify.
+
+Usage:
+    python collection_preview.py tagged.csv [--compare old_tagged.csv] [--json preview.json]
+"""
+
+import argparse
+import csv
+import json
+from contextlib import ExitStack
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tag_delta import parse_tags
+from tag_io import columnar_format, read_columnar
+
+# Smart collections from the spec's "collections" section
+COLLECTIONS = [
+    # Core navigation collections
+    {'name': 'Bongs', 'include': ['family:glass-bong', 'family:silicone-bong']},
+    {'name': 'Dab Rigs', 'include': ['family:glass-rig', 'family:silicone-rig']},
+    {'name': 'Bubblers', 'include': ['family:bubbler', 'family:joint-bubbler']},
+    {'name': 'Hand Pipes', 'include': ['family:spoon-pipe']},
+    {'name': 'One Hitters and Chillums', 'include': ['family:chillum-onehitter']},
+    {'name': 'Nectar Collectors',
+     'include': ['family:nectar-collector', 'family:electronic-nectar-collector']},
+    {'name': 'Flower Bowls', 'include': ['family:flower-bowl']},
+    {'name': 'Quartz Bangers', 'include': ['family:banger']},
+    {'name': 'Carb Caps', 'include': ['family:carb-cap']},
+    {'name': 'Dab Tools', 'include': ['family:dab-tool']},
+    {'name': 'Grinders', 'include': ['family:grinder']},
+    {'name': 'Rolling Papers and Cones', 'include': ['family:rolling-paper']},
+    {'name': 'Rolling Accessories', 'include': ['family:rolling-accessory']},
+    {'name': 'Trays and Work Surfaces', 'include': ['family:tray']},
+    {'name': 'Torches', 'include': ['family:torch']},
+    {'name': 'Ash Catchers and Downstems', 'include': ['family:ash-catcher', 'family:downstem']},
+    {'name': 'Vapes and Electronics',
+     'include': ['family:vape-battery', 'family:vape-coil', 'family:electronic-nectar-collector']},
+    {'name': 'Packaging and Storage', 'include': ['family:storage-accessory', 'pillar:packaging']},
+    {'name': 'Pendants and Merch', 'include': ['family:merch-pendant', 'pillar:merch']},
+    # Brand collections
+    {'name': 'RAW Collection', 'include': ['brand:raw']},
+    {'name': 'Zig Zag Collection', 'include': ['brand:zig-zag']},
+    {'name': 'Vibes Collection', 'include': ['brand:vibes']},
+    {'name': 'Elements Collection', 'include': ['brand:elements']},
+    {'name': 'Cookies Collection', 'include': ['brand:cookies']},
+    {'name': 'Lookah Collection', 'include': ['brand:lookah']},
+    {'name': 'Puffco Collection', 'include': ['brand:puffco']},
+    {'name': 'Maven Collection', 'include': ['brand:maven']},
+    {'name': 'G Pen Collection', 'include': ['brand:g-pen']},
+    {'name': 'Only Quartz Collection', 'include': ['brand:only-quartz']},
+    {'name': 'EO Vape Collection', 'include': ['brand:eo-vape']},
+    {'name': 'Monark Collection', 'include': ['brand:monark']},
+    {'name': '710 SCI Collection', 'include': ['brand:710-sci']},
+    {'name': 'Peaselburg Collection', 'include': ['brand:peaselburg']},
+    {'name': 'Scorch Collection', 'include': ['brand:scorch']},
+    # Theme collections
+    {'name': 'Made In USA Glass', 'include': ['style:made-in-usa'],
+     'exclude': ['pillar:packaging', 'pillar:merch']},
+    {'name': 'Heady Glass', 'include': ['style:heady']},
+    {'name': 'Silicone Rigs and Bongs', 'include': ['material:silicone']},
+    {'name': 'Travel Friendly', 'include': ['style:travel-friendly']},
+]
+
+
+def iter_product_tags(path: str) -> Iterator[Tuple[str, List[str]]]:
+    """(handle, tags) for every product row of a tagged CSV or Parquet/Arrow file."""
+    with ExitStack() as files:
+        if columnar_format(path):
+            _, rows = files.enter_context(read_columnar(path))
+        else:
+            rows = csv.DictReader(files.enter_context(open(path, 'r', encoding='utf-8', newline='')))
+        for row in rows:
+            if row.get('Title', '') and row.get('Handle', ''):
+                yield row['Handle'], parse_tags(row.get('Tags', ''))
+
+
+class TagIndex:
+    """Inverted index from tag to a bitmap of the products carrying it."""
+
+    def __init__(self, products: Iterable[Tuple[str, List[str]]]):
+        self.handles = []
+        postings = {}
+        for handle, tags in products:
+            product_id = len(self.handles)
+            self.handles.append(handle)
+            for tag in tags:
+                postings.setdefault(tag, []).append(product_id)
+
+        # Set the bits in a bytearray and convert once; OR-ing bits into an
+        # int one at a time would copy the whole int for every product
+        size = (len(self.handles) + 7) // 8
+        self.bitmaps = {}
+        for tag, product_ids in postings.items():
+            bits = bytearray(size)
+            for product_id in product_ids:
+                bits[product_id >> 3] |= 1 << (product_id & 7)
+            self.bitmaps[tag] = int.from_bytes(bits, 'little')
+
+    @classmethod
+    def from_file(cls, path: str) -> 'TagIndex':
+        return cls(iter_product_tags(path))
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def any_of(self, tags: Iterable[str]) -> int:
+        bitmap = 0
+        for tag in tags:
+            bitmap |= self.bitmaps.get(tag, 0)
+        return bitmap
+
+    def evaluate(self, collection: Dict) -> int:
+        """Bitmap of the products in a collection."""
+        members = self.any_of(collection['include'])
+        if collection.get('exclude'):
+            members &= ~self.any_of(collection['exclude'])
+        return members
+
+    def members(self, bitmap: int) -> List[str]:
+        """Handles of the products set in a bitmap."""
+        handles = []
+        bits = bitmap.to_bytes((len(self.handles) + 7) // 8, 'little')
+        for byte_index, byte in enumerate(bits):
+            while byte:
+                low_bit = byte & -byte
+                handles.append(self.handles[(byte_index << 3) + low_bit.bit_length() - 1])
+                byte ^= low_bit
+        return handles
+
+
+def preview(index: TagIndex, collections: List[Dict] = COLLECTIONS) -> Dict[str, int]:
+    """Collection name -> bitmap of its members."""
+    return {collection['name']: index.evaluate(collection) for collection in collections}
+
+
+def compare(old: TagIndex, new: TagIndex, collections: List[Dict] = COLLECTIONS) -> Dict[str, Dict]:
+    """Per collection: old and new counts, and the handles that moved in or out."""
+    old_members = preview(old, collections)
+    new_members = preview(new, collections)
+    same_products = old.handles == new.handles
+    changes = {}
+    for name in new_members:
+        if same_products:
+            # Same products in the same order: the bitmaps line up directly
+            added = new.members(new_members[name] & ~old_members[name])
+            removed = old.members(old_members[name] & ~new_members[name])
+        else:
+            before = set(old.members(old_members[name]))
+            after = set(new.members(new_members[name]))
+            added = sorted(after - before)
+            removed = sorted(before - after)
+        changes[name] = {
+            'old_count': old_members[name].bit_count(),
+            'new_count': new_members[name].bit_count(),
+            'added': added,
+            'removed': removed,
+        }
+    return changes
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Preview smart collection membership from tagged output.")
+    parser.add_argument('tagged', help='tagged output (CSV, .parquet or .arrow)')
+    parser.add_argument('--compare', metavar='OLD',
+                        help='earlier tagged output to diff collection membership against')
+    parser.add_argument('--members', metavar='NAME', action='append', default=[],
+                        help='also list the handles in this collection (repeatable)')
+    parser.add_argument('--json', metavar='PATH', help='write counts and changes as JSON')
+    args = parser.parse_args(argv)
+
+    index = TagIndex.from_file(args.tagged)
+    memberships = preview(index)
+    print(f"{len(index)} products, {len(index.bitmaps)} distinct tags")
+
+    result = {'products': len(index), 'collections': {}}
+    if args.compare:
+        changes = compare(TagIndex.from_file(args.compare), index)
+        for name, change in changes.items():
+            print(f"  {name:<30} {change['old_count']:>7} -> {change['new_count']:<7} "
+                  f"+{len(change['added'])} -{len(change['removed'])}")
+        result['collections'] = changes
+    else:
+        for name, bitmap in memberships.items():
+            print(f"  {name:<30} {bitmap.bit_count():>7}")
+        result['collections'] = {name: {'count': bitmap.bit_count()} for name, bitmap in memberships.items()}
+
+    for name in args.members:
+        if name not in memberships:
+            parser.error(f"unknown collection: {name}")
+        handles = index.members(memberships[name])
+        result['collections'][name]['members'] = handles
+        print(f"\n{name}:")
+        for handle in handles:
+            print(f"  {handle}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as handle:
+            json.dump(result, handle, indent=2)
+        print(f"\nPreview written to: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,296 +3,396 @@
 Shopify Product Tag Generator for What You Need Products
 Based on the tagging specification document.
 Version 2 - More precise extraction focused on Title and Type
+
+Usage:
+    python generate_tags.py [input.csv] [output.csv] [--workers N] [--cache tags.db] [--profile]
+                            [--delta changed.csv [--previous old_output.csv]] [--unordered]
 """
 
+import argparse
 import csv
+import hashlib
+import json
+import math
+import numbers
+import os
 import re
+import sys
 import html
-from typing import List, Dict, Optional, Set
+from collections import OrderedDict, deque
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional
+
+from tag_cache import TagCache
+from tag_delta import TagDelta, load_previous_tags
+from tag_handles import HandleIndex
+from tag_io import TAGGER_COLUMNS, ColumnarWriter, columnar_format, read_columnar
+from tag_memo import BoundedMemo
+from tag_profile import TagProfile, merge_counts
+from tag_rules import BrandMatch, FamilyClassifier, KeywordMatcher, load_rules
+from tag_validator import TagValidator
+from tag_vocab import TagVocabulary
+
+DEFAULT_INPUT_CSV = '/home/user/Shopify-Products-Optimizer/WYN PRODUCT EXPORT.csv'
+DEFAULT_OUTPUT_CSV = '/home/user/Shopify-Products-Optimizer/WYN_PRODUCT_EXPORT_TAGGED.csv'
+
+# Products per batch in process_csv; also the unit of work sent to workers
+DEFAULT_BATCH_SIZE = 500
+
+# Least confidence at which --fuzzy-brands adds a fuzzily matched brand;
+# weaker matches only go to the review file
+DEFAULT_FUZZY_BRAND_CONFIDENCE = 0.9
+
+BRAND_REVIEW_FIELDNAMES = ['Handle', 'Title', 'Brand', 'Confidence', 'Matched']
+
+# Memory budget of the title-only extractor memo (TITLE_MEMO)
+DEFAULT_TITLE_MEMO_BYTES = 64 * 1024 * 1024
+
+# Product handles remembered for the image/variant rows that follow them;
+# rows trailing further behind need --unordered
+RECENT_HANDLES = 100000
 
 # ============================================================================
 # CONFIGURATION - Tag Dimension Values
 # ============================================================================
 
-KNOWN_BRANDS = {
-    'raw ': 'brand:raw',
-    ' raw ': 'brand:raw',
-    'zig zag': 'brand:zig-zag',
-    'zig-zag': 'brand:zig-zag',
-    'zigzag': 'brand:zig-zag',
-    'vibes ': 'brand:vibes',
-    ' vibes': 'brand:vibes',
-    'elements ': 'brand:elements',
-    ' elements': 'brand:elements',
-    'cookies ': 'brand:cookies',
-    ' cookies': 'brand:cookies',
-    'lookah': 'brand:lookah',
-    'puffco': 'brand:puffco',
-    'maven ': 'brand:maven',
-    ' maven ': 'brand:maven',
-    'g-pen': 'brand:g-pen',
-    'g pen': 'brand:g-pen',
-    'gpen': 'brand:g-pen',
-    'only quartz': 'brand:only-quartz',
-    'eo vape': 'brand:eo-vape',
-    'eo-vape': 'brand:eo-vape',
-    'monark': 'brand:monark',
-    '710 sci': 'brand:710-sci',
-    '710-sci': 'brand:710-sci',
-    '710sci': 'brand:710-sci',
-    'peaselburg': 'brand:peaselburg',
-    'scorch ': 'brand:scorch',
-    ' scorch': 'brand:scorch',
-    'empire glassworks': 'brand:empire-glassworks',
-    'mj arsenal': 'brand:mj-arsenal',
-    'ooze ': 'brand:ooze',
-    ' ooze': 'brand:ooze',
-    'pulsar': 'brand:pulsar',
-    'higher standards': 'brand:higher-standards',
-    'grav ': 'brand:grav',
-    ' grav ': 'brand:grav',
-    'famous x': 'brand:famous-x',
-    'famous-x': 'brand:famous-x',
-    'juicy jay': 'brand:juicy-jay',
-    'juicy jays': 'brand:juicy-jay',
-    'high hemp': 'brand:high-hemp',
-    'king palm': 'brand:king-palm',
-    'clipper': 'brand:clipper',
-    ' bic ': 'brand:bic',
-    'blazer ': 'brand:blazer',
-    ' blazer': 'brand:blazer',
-    'special blue': 'brand:special-blue',
-    'newport ': 'brand:newport',
-    'zico': 'brand:zico',
-    'santa cruz shredder': 'brand:santa-cruz-shredder',
-    'space case': 'brand:space-case',
-    'sharpstone': 'brand:sharpstone',
-    'cali crusher': 'brand:cali-crusher',
-    'kannastor': 'brand:kannastor',
-    'otto ': 'brand:otto',
-    ' otto': 'brand:otto',
-    'shine ': 'brand:shine',
-    'blazy susan': 'brand:blazy-susan',
-    ' ocb ': 'brand:ocb',
-    'ocb ': 'brand:ocb',
-    ' job ': 'brand:job',
-    "randy's": 'brand:randy',
-    'randys': 'brand:randy',
-    'dab nation': 'brand:dab-nation',
+# Brand aliases, type mapping, family profiles and family rules are data:
+# see rules.json, and tag_rules for its format
+RULES = load_rules()
+KNOWN_BRANDS = RULES.known_brands
+TYPE_MAPPING = RULES.type_mapping
+FAMILY_PROFILES = RULES.family_profiles
+FAMILY_RULES = RULES.family_rules
+
+# Every regex used by the extractors, compiled once. Patterns whose
+# alternatives are named groups are read with _search_by_priority: the
+# alternatives are listed in priority order, and the leftmost match of the
+# highest-priority alternative wins.
+PATTERNS = {
+    'html_tag': re.compile(r'<[^>]+>'),
+    'html_cut': re.compile(r'[ \t\n\f<&]'),
+    'material_spec': re.compile(r'material[:\s]+(\w+)'),
+    'joint_size': re.compile(
+        r'\b(?:(?P<size_10>10)|(?P<size_14>14)|(?P<size_18>18|19))\s*mm\b'
+    ),
+    'joint_size_title': re.compile(r'\b(10|14|18|19)\s*(male|female|m|f)\b'),
+    'joint_angle': re.compile(
+        r'(?P<angle_45>\b45\s*(?:degree|°|deg)?\b|45°)'
+        r'|(?P<angle_90>\b90\s*(?:degree|°|deg)?\b|90°)'
+    ),
+    'joint_gender': re.compile(r'\b(?:(?P<female>female)|(?P<male>male))\b'),
+    'joint_gender_title': re.compile(r'\b\d+\s*(?:(?P<female>f)|(?P<male>m))\b'),
+    'length': re.compile(
+        r'(?P<inch>\d+(?:\.\d+)?)\s*(?:inch|inches|in|")'
+        r"|(?P<prime>\d+(?:\.\d+)?)[″'']"
+        r'|^(?P<leading>\d+)\s*(?:inch|in|"|″)'
+        r'|(?P<word>\d+)\s*(?:INCH|inch|In|IN)\b'
+    ),
+    'capacity': re.compile(r'(?P<ml>\d+)\s*ml\b|(?P<oz>\d+)\s*oz\b'),
+    'bundle': re.compile(
+        r'(?P<pack>\d+)\s*(?:-\s*)?pack\b'
+        r'|(?P<pieces>\d+)\s*(?:pk|pc|pcs|pieces?|count|ct)\b'
+        r'|(?P<display>\bdisplay\s*(?:box|case)?\b)'
+        r'|(?P<carton>\bcarton\b)'
+        r'|(?P<bulk>\bbulk\s*(?:case|box)?\b)'
+    ),
+    'made_in_usa': re.compile(r'made\s+in\s+(?:the\s+)?usa'),
+    'usa_origin': re.compile(
+        r'(?:made|crafted|built)\s+in\s+(?:spokane|eugene|portland|los angeles|san diego|denver)'
+    ),
+    'heady_category': re.compile(r'category[:\s]+.*heady'),
+    # A number and the unit word or quote mark right after it ("5-pack" too)
+    'number_unit': re.compile(r'\d+(?:\.\d+)?\s*(?:-\s*)?([a-z]+|["″\'])?'),
+}
+
+JOINT_SIZE_TAGS = {
+    'size_10': 'joint_size:10mm',
+    'size_14': 'joint_size:14mm',
+    'size_18': 'joint_size:18mm',
 }
 
-# Type to family/pillar mapping
-TYPE_MAPPING = {
-    'bongs & water pipes': {
-        'pillar': 'pillar:smokeshop-device',
-        'family': 'family:glass-bong',
-        'format': 'format:bong',
-        'use': ['use:flower-smoking'],
-        'default_material': ['material:glass'],
-    },
-    'dab rigs / oil rigs': {
-        'pillar': 'pillar:smokeshop-device',
-        'family': 'family:glass-rig',
-        'format': 'format:rig',
-        'use': ['use:dabbing'],
-        'default_material': ['material:glass'],
-    },
-    'bubblers': {
-        'pillar': 'pillar:smokeshop-device',
-        'family': 'family:bubbler',
-        'format': 'format:bubbler',
-        'use': ['use:flower-smoking'],
-        'default_material': ['material:glass'],
-    },
-    'hand pipes': {
-        'pillar': 'pillar:smokeshop-device',
-        'family': 'family:spoon-pipe',
-        'format': 'format:pipe',
-        'use': ['use:flower-smoking'],
-        'default_material': ['material:glass'],
-    },
-    'one hitters & chillums': {
-        'pillar': 'pillar:smokeshop-device',
-        'family': 'family:chillum-onehitter',
-        'format': 'format:pipe',
-        'use': ['use:flower-smoking'],
-        'default_material': ['material:glass'],
-    },
-    'nectar collectors & straws': {
-        'pillar': 'pillar:smokeshop-device',
-        'family': 'family:nectar-collector',
-        'format': 'format:nectar-collector',
-        'use': ['use:dabbing'],
-        'default_material': ['material:glass'],
-    },
-    'flower bowls': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:flower-bowl',
-        'format': 'format:accessory',
-        'use': ['use:flower-smoking'],
-        'default_material': ['material:glass'],
-    },
-    'carb caps': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:carb-cap',
-        'format': 'format:cap',
-        'use': ['use:dabbing'],
-        'default_material': ['material:glass'],
-    },
-    'dab tools / dabbers': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:dab-tool',
-        'format': 'format:tool',
-        'use': ['use:dabbing'],
-        'default_material': ['material:metal'],
-    },
-    'grinders': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:grinder',
-        'format': 'format:grinder',
-        'use': ['use:flower-smoking'],  # Per spec line 498
-        'default_material': ['material:metal'],
-    },
-    'rolling papers': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:rolling-paper',
-        'format': 'format:paper',
-        'use': ['use:rolling'],
-        'default_material': [],
-    },
-    'torches': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:torch',
-        'format': 'format:torch',
-        'use': ['use:dabbing'],
-        'default_material': ['material:metal'],
-    },
-    'electronics': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:vape-battery',
-        'format': 'format:battery-mod',
-        'use': ['use:dabbing'],
-        'default_material': ['material:metal'],
-    },
-    'essentials & accessories': {
-        'pillar': 'pillar:accessory',
-        'family': None,  # Needs to be determined from content
-        'format': 'format:accessory',
-        'use': ['use:flower-smoking'],
-        'default_material': ['material:glass'],
-    },
-    # Theme types - need to determine family from content
-    'quartz': {
-        'pillar': 'pillar:accessory',
-        'family': 'family:banger',
-        'format': 'format:banger',
-        'use': ['use:dabbing'],
-        'default_material': ['material:quartz'],
-    },
-    'silicone': {
-        'pillar': None,  # Determine from content
-        'family': None,  # Determine from content
-        'format': None,
-        'use': None,
-        'default_material': ['material:silicone'],
-    },
-    'pendants': {
-        # Most pendants are decorative - determine from content if carb cap
-        'pillar': None,  # Determine from content
-        'family': None,  # Determine from content
-        'format': None,
-        'use': None,
-        'default_material': ['material:glass'],
-    },
-    'packaging': {
-        'pillar': 'pillar:packaging',
-        'family': 'family:storage-accessory',
-        'format': 'format:box',
-        'use': ['use:storage'],
-        'default_material': [],
-    },
-    'made in usa': {
-        'pillar': None,  # Determine from content
-        'family': None,  # Determine from content
-        'format': None,
-        'use': None,
-        'style_override': ['style:made-in-usa'],
-        'default_material': ['material:glass'],
-    },
-    'wyn brands': {
-        'pillar': None,  # Determine from content
-        'family': None,  # Determine from content
-        'format': None,
-        'use': None,
-        'style_override': ['style:brand-highlight'],
-        'default_material': ['material:glass'],
-    },
+BUNDLE_TAGS = {
+    'display': 'bundle:display-box',
+    'carton': 'bundle:display-box',
+    'bulk': 'bundle:bulk-case',
 }
 
+# Keywords the extractors look up in ProductText.title_hits, which finds
+# all of them (and the family rules' title keywords) in one scan of the
+# title; a word checked there must be listed here
+TITLE_MATERIAL_KEYWORDS = ('borosilicate', 'glass', 'quartz', 'silicone', 'titanium', 'stainless',
+                           'ceramic', 'wood', 'wooden', 'metal', 'aluminum')
+ANIMAL_TERMS = ('dragon', 'shark', 'owl', 'turtle', 'bird', 'frog', 'cat', 'dog', 'snake', 'octopus',
+                'fish', 'skull', 'monster', 'animal', 'dino', 'dinosaur')
+TRAVEL_TERMS = ('travel', 'pocket', 'mini')
+# Title words that some joint or bundle pattern needs when no number unit does
+JOINT_KEYWORDS = ('male', '45', '90')
+BUNDLE_KEYWORDS = ('display', 'carton', 'bulk')
+# Title words that let content override a functional Type's family
+OVERRIDE_KEYWORDS = ('ashtray', 'rolling tray', 'tray', 'match', 'cleaner', 'drop down', 'dropdown', 'pendant')
+TITLE_KEYWORDS = frozenset(TITLE_MATERIAL_KEYWORDS + ANIMAL_TERMS + TRAVEL_TERMS + OVERRIDE_KEYWORDS
+                           + JOINT_KEYWORDS + BUNDLE_KEYWORDS + ('usa', 'heady', 'collab'))
+
+# Units after a number (see ProductText.title_units) that the title-only
+# extractors need: every alternative of the length and capacity patterns
+# has one of theirs, and every joint or bundle alternative has one of
+# theirs or one of their keywords above
+LENGTH_UNITS = frozenset({'in', '"', '″', "'"})
+CAPACITY_UNITS = frozenset({'ml', 'oz'})
+JOINT_UNITS = frozenset({'mm', 'ma', 'fe', 'm', 'f'})
+BUNDLE_UNITS = frozenset({'pa', 'pk', 'pc', 'pi', 'co', 'ct'})
+
+
+def _search_by_priority(pattern: re.Pattern, text: str) -> Optional[re.Match]:
+    """Leftmost match of the highest-priority alternative, in one scan.
+
+    The pattern's groups are its alternatives in priority order, so the
+    winning match is the one with the lowest lastindex.
+    """
+    best = None
+    for match in pattern.finditer(text):
+        if best is None or match.lastindex < best.lastindex:
+            best = match
+            if best.lastindex == 1:
+                break
+    return best
+
+
+BRAND_INDEX = RULES.brand_index
+FUZZY_BRAND_INDEX = RULES.fuzzy_brand_index
+FAMILY_CLASSIFIER = RULES.family_classifier
+# Every tag the tables can produce, interned; extracted values such as
+# lengths and pack counts are not added, so it stays the same size however
+# many titles a long-running tag_service sees
+TAG_VOCABULARY = TagVocabulary.from_tables(KNOWN_BRANDS, TYPE_MAPPING, FAMILY_PROFILES,
+                                           JOINT_SIZE_TAGS, BUNDLE_TAGS)
+# Answers of the title-only extractors, keyed by (kind, title)
+TITLE_MEMO = BoundedMemo(DEFAULT_TITLE_MEMO_BYTES)
+
+
+def _ruleset_version() -> str:
+    """Hash of the rules file, the regexes and this module's code.
+
+    Used as part of the tag cache key, so editing a rule or any extractor
+    invalidates every cached product.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(RULES.version.encode('utf-8'))
+    patterns = {name: pattern.pattern for name, pattern in PATTERNS.items()}
+    digest.update(json.dumps(patterns, sort_keys=True).encode('utf-8'))
+    with open(__file__, 'rb') as source:
+        digest.update(source.read())
+    return digest.hexdigest()
+
+
+RULESET_VERSION = _ruleset_version()
+
 
-def strip_html(text: str) -> str:
-    """Remove HTML tags and decode entities."""
+def strip_html(text: str, limit: Optional[int] = None) -> str:
+    """Remove HTML tags and decode entities.
+
+    With `limit`, returns the first `limit` characters of the full result
+    while only cleaning as much of the input as it takes to produce them.
+    """
     if not text:
         return ""
-    # Decode HTML entities
-    text = html.unescape(text)
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', ' ', text)
-    # Clean up whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    if limit is not None and len(text) > limit:
+        return _strip_html_prefix(text, limit)
+    # Decode entities, blank out tags, then collapse and trim whitespace in
+    # one split/join pass (str.split() and \s agree on what whitespace is)
+    text = PATTERNS['html_tag'].sub(' ', html.unescape(text))
+    text = ' '.join(text.split())
+    return text if limit is None else text[:limit]
+
+
+def _strip_html_prefix(text: str, limit: int) -> str:
+    """strip_html(text)[:limit], cleaning a growing prefix of the raw HTML.
+
+    The raw text is only cut just before whitespace, '<' or '&', so no
+    entity or tag is split by the cut. A tag still open at the end of the
+    cleaned prefix could swallow text past it, so the prefix is trimmed back
+    to that tag's '<'. What remains cleans to a prefix of the full result.
+
+    Each step re-cleans the prefix from the start, so the prefix grows (at
+    least doubling) to where the text density seen so far puts `limit`
+    characters, and once it would be over a third of the input one full
+    strip is cheaper: all the steps together then cost under twice a full
+    strip_html, however little text the markup holds.
+    """
+    end = max(limit * 2, 256)
+    while end * 3 <= len(text):
+        cut = PATTERNS['html_cut'].search(text, end)
+        if cut is None:
+            break
+        chunk = html.unescape(text[:cut.start()])
+        open_tag = chunk.find('<', chunk.rfind('>') + 1)
+        if open_tag != -1:
+            chunk = chunk[:open_tag]
+        chunk = ' '.join(PATTERNS['html_tag'].sub(' ', chunk).split())
+        if len(chunk) >= limit:
+            return chunk[:limit]
+        end = max(end * 2, cut.start() * limit // max(len(chunk), 1) * 5 // 4)
+    return strip_html(text)[:limit]
+
+
+def _unescape_lower(body_html: str) -> str:
+    return html.unescape(body_html).lower()
+
+
+def _strip_tags_lower(scan: str) -> str:
+    # Lowercasing never touches '<', '>' or whitespace, so cleaning the
+    # lowercased text gives the same result as the other way round
+    return ' '.join(PATTERNS['html_tag'].sub(' ', scan).split())
+
+
+@lru_cache(maxsize=4)
+def _title_matcher(classifier: FamilyClassifier) -> KeywordMatcher:
+    """One matcher for the extractors' title keywords and those of classifier's rules."""
+    return KeywordMatcher(TITLE_KEYWORDS | classifier.title_keywords)
+
+
+def _number_units(text: str) -> FrozenSet[str]:
+    """The units that directly follow a number in lowercased text.
+
+    Units are reduced to their first two letters ("inches" -> "in",
+    "mls" -> "ml"), or the quote mark itself; a number with no unit after
+    it gives ''.
+    """
+    return frozenset(unit[:2] for unit in PATTERNS['number_unit'].findall(text))
+
+
+class ProductText:
+    """A product's title and body, with the body cleaned only on demand.
+
+    Most tags come from the title alone, so the body HTML is not stripped
+    until an extractor actually reads it, and then only once. Before that,
+    body_may_contain answers "could this phrase be in the body?" from the
+    unescaped, lowercased HTML: stripping tags and collapsing whitespace
+    never joins two words, so a word missing there is missing from the
+    cleaned body too.
+
+    The title is scanned once, on first use of title_hits, for every
+    keyword the extractors and the family rules look for, and once, on
+    first use of title_units, for numbers and their units, so each
+    extractor reads set lookups instead of searching the title again.
+    """
+
+    __slots__ = ('title', 'title_lower', 'body_parsed', '_body_html', '_scan', '_body_lower',
+                 '_title_hits', '_title_units')
+
+    def __init__(self, title: str, body_html: str = ""):
+        self.title = title
+        self.title_lower = title.lower()
+        self.body_parsed = False
+        self._body_html = body_html
+        self._scan = None
+        self._body_lower = None
+        self._title_hits = None
+        self._title_units = None
+
+    @property
+    def title_hits(self) -> set:
+        """Every TITLE_KEYWORDS word and family rule title keyword in title_lower."""
+        if self._title_hits is None:
+            self._title_hits = _title_matcher(FAMILY_CLASSIFIER).hits(self.title_lower)
+        return self._title_hits
+
+    @property
+    def title_units(self) -> FrozenSet[str]:
+        """The units right after a number in title_lower (see _number_units)."""
+        if self._title_units is None:
+            self._title_units = _number_units(self.title_lower)
+        return self._title_units
+
+    @classmethod
+    def from_body(cls, title: str, body: str) -> 'ProductText':
+        """Wrap a body that has already been through strip_html."""
+        text = cls(title)
+        text._scan = text._body_lower = body.lower() if body else ""
+        return text
+
+    def _body_scan(self) -> str:
+        if self._scan is None:
+            self._scan = _unescape_lower(self._body_html) if self._body_html else ""
+        return self._scan
+
+    def body_may_contain(self, *phrases: str) -> bool:
+        """False only when none of the phrases can appear in body_lower."""
+        scan = self._body_scan()
+        return any(all(word in scan for word in phrase.split()) for phrase in phrases)
+
+    @property
+    def body_lower(self) -> str:
+        """The cleaned, lowercased body: strip_html(body_html).lower()."""
+        if self._body_lower is None:
+            self._body_lower = _strip_tags_lower(self._body_scan())
+            self.body_parsed = True
+        return self._body_lower
+
+    def body_prefix_lower(self, size: int) -> str:
+        """body_lower[:size], cleaning only as much of the HTML as that takes."""
+        if self._body_lower is None:
+            prefix = strip_html(self._body_html, size)
+            # A capital sigma lowercases by what follows it, which the cut hides
+            if 'Σ' not in prefix:
+                self.body_parsed = True
+                return prefix.lower()[:size]
+        return self.body_lower[:size]
 
 
 def extract_brand(title: str) -> Optional[str]:
     """Extract brand from title only (more precise)."""
     title_lower = f" {title.lower()} "
+    return BRAND_INDEX.find(title_lower)
 
-    # Check for known brands (longer names first to avoid partial matches)
-    sorted_brands = sorted(KNOWN_BRANDS.keys(), key=len, reverse=True)
-    for brand_name in sorted_brands:
-        if brand_name in title_lower:
-            return KNOWN_BRANDS[brand_name]
 
-    return None
+def extract_brand_fuzzy(title: str) -> Optional[BrandMatch]:
+    """Brand from the title with typos and spacing variants allowed, and how confident the match is."""
+    return TITLE_MEMO.lookup(('fuzzy_brand', title), FUZZY_BRAND_INDEX.find, title)
 
 
 def extract_materials_from_spec(title: str, body: str) -> List[str]:
     """Extract material tags from product specification sections only."""
+    return _extract_materials(ProductText.from_body(title, body))
+
+
+def _extract_materials(text: ProductText) -> List[str]:
     materials = set()
 
     # First check title for explicit materials
-    title_lower = title.lower()
+    title_hits = text.title_hits
 
     # Check title for materials
-    if 'borosilicate' in title_lower:
+    if 'borosilicate' in title_hits:
         materials.add('material:glass')
         materials.add('material:borosilicate')
-    elif 'glass' in title_lower:
+    elif 'glass' in title_hits:
         materials.add('material:glass')
 
-    if 'quartz' in title_lower:
+    if 'quartz' in title_hits:
         materials.add('material:quartz')
 
-    if 'silicone' in title_lower:
+    if 'silicone' in title_hits:
         materials.add('material:silicone')
 
-    if 'titanium' in title_lower:
+    if 'titanium' in title_hits:
         materials.add('material:titanium')
 
-    if 'stainless' in title_lower:
+    if 'stainless' in title_hits:
         materials.add('material:stainless-steel')
 
-    if 'ceramic' in title_lower:
+    if 'ceramic' in title_hits:
         materials.add('material:ceramic')
 
-    if 'wood' in title_lower or 'wooden' in title_lower:
+    if 'wood' in title_hits or 'wooden' in title_hits:
         materials.add('material:wood')
 
-    if 'metal' in title_lower or 'aluminum' in title_lower:
+    if 'metal' in title_hits or 'aluminum' in title_hits:
         materials.add('material:metal')
 
     # Check body for materials in specification sections
-    body_lower = body.lower() if body else ""
+    body_lower = text.body_lower if text.body_may_contain('borosilicate', 'material') else ""
 
     # Look for material in spec table or explicit material mentions
     if 'borosilicate' in body_lower:
@@ -300,7 +400,7 @@ def extract_materials_from_spec(title: str, body: str) -> List[str]:
         materials.add('material:borosilicate')
 
     # Look for explicit material specification
-    mat_match = re.search(r'material[:\s]+(\w+)', body_lower)
+    mat_match = PATTERNS['material_spec'].search(body_lower)
     if mat_match:
         mat = mat_match.group(1)
         if 'borosilicate' in mat or 'boro' in mat:
@@ -321,153 +421,126 @@ def extract_materials_from_spec(title: str, body: str) -> List[str]:
         elif 'metal' in mat or 'aluminum' in mat:
             materials.add('material:metal')
 
-    return list(materials)
+    return sorted(materials)
 
 
 def extract_joint_details(title: str, body: str) -> List[str]:
     """Extract joint size, angle, and gender from title and body."""
+    return _extract_joint_details(ProductText.from_body(title, body))
+
+
+def _extract_joint_details(text: ProductText) -> List[str]:
+    # Every body match needs one of these fragments; without them the
+    # answer only depends on the title
+    if not text.body_may_contain('mm', '45', '90', 'male'):
+        return list(TITLE_MEMO.lookup(('joints', text.title_lower), _title_joint_details, text))
+    return _joint_details(text.title_lower, text.body_lower)
+
+
+def _title_joint_details(text: ProductText) -> tuple:
+    if text.title_units.isdisjoint(JOINT_UNITS) and text.title_hits.isdisjoint(JOINT_KEYWORDS):
+        return ()
+    return tuple(_joint_details(text.title_lower, ""))
+
+
+def _joint_details(title_lower: str, body_lower: str) -> List[str]:
     # Prioritize title
-    combined = f"{title} {body}".lower()
+    combined = f"{title_lower} {body_lower}"
     joint_tags = []
 
-    # Joint size patterns
-    size_found = False
-    size_patterns = [
-        (r'\b10\s*mm\b', 'joint_size:10mm'),
-        (r'\b10mm\b', 'joint_size:10mm'),
-        (r'\b14\s*mm\b', 'joint_size:14mm'),
-        (r'\b14mm\b', 'joint_size:14mm'),
-        (r'\b18\s*mm\b', 'joint_size:18mm'),
-        (r'\b18mm\b', 'joint_size:18mm'),
-        (r'\b19\s*mm\b', 'joint_size:18mm'),
-    ]
-
-    for pattern, tag in size_patterns:
-        if re.search(pattern, combined):
-            if not size_found:
-                joint_tags.append(tag)
-                size_found = True
-            break
-
-    # Check title patterns like "14 MALE" or "18 FEMALE"
-    title_size = re.search(r'\b(10|14|18|19)\s*(male|female|m|f)\b', title.lower())
-    if title_size and not size_found:
-        size = title_size.group(1)
-        if size == '19':
-            size = '18'
-        joint_tags.append(f'joint_size:{size}mm')
+    # Joint size: 10mm beats 14mm beats 18mm (19mm counts as 18mm)
+    size_match = _search_by_priority(PATTERNS['joint_size'], combined)
+    if size_match:
+        joint_tags.append(JOINT_SIZE_TAGS[size_match.lastgroup])
+    else:
+        # Check title patterns like "14 MALE" or "18 FEMALE"
+        title_size = PATTERNS['joint_size_title'].search(title_lower)
+        if title_size:
+            size = title_size.group(1)
+            if size == '19':
+                size = '18'
+            joint_tags.append(f'joint_size:{size}mm')
 
     # Joint angle patterns
-    if re.search(r'\b45\s*(degree|°|deg)?\b', combined) or '45°' in combined:
-        joint_tags.append('joint_angle:45')
-    elif re.search(r'\b90\s*(degree|°|deg)?\b', combined) or '90°' in combined:
-        joint_tags.append('joint_angle:90')
-
-    # Joint gender patterns
-    if re.search(r'\bfemale\b', combined):
-        joint_tags.append('joint_gender:female')
-    elif re.search(r'\bmale\b', combined):
-        joint_tags.append('joint_gender:male')
-    elif re.search(r'\b\d+\s*f\b', title.lower()):
-        joint_tags.append('joint_gender:female')
-    elif re.search(r'\b\d+\s*m\b', title.lower()):
-        joint_tags.append('joint_gender:male')
+    angle_match = _search_by_priority(PATTERNS['joint_angle'], combined)
+    if angle_match:
+        joint_tags.append('joint_angle:45' if angle_match.lastgroup == 'angle_45' else 'joint_angle:90')
+
+    # Joint gender patterns, falling back to "14F" / "18M" style shorthand in the title
+    gender_match = (_search_by_priority(PATTERNS['joint_gender'], combined)
+                    or _search_by_priority(PATTERNS['joint_gender_title'], title_lower))
+    if gender_match:
+        joint_tags.append(f'joint_gender:{gender_match.lastgroup}')
 
     return joint_tags
 
 
 def extract_length(title: str) -> Optional[str]:
     """Extract length in inches from title only."""
-    title_lower = title.lower()
-
-    # Patterns for length in title
-    patterns = [
-        r'(\d+(?:\.\d+)?)\s*(?:inch|inches|in|")',
-        r"(\d+(?:\.\d+)?)[″'']",
-        r'^(\d+)\s*(?:inch|in|"|″)',
-        r'(\d+)\s*(?:INCH|inch|In|IN)\b',
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, title)
-        if match:
-            length = match.group(1)
-            try:
-                length_num = float(length)
-                if length_num == int(length_num):
-                    return f"length:{int(length_num)}in"
-                else:
-                    return f"length:{length}in"
-            except:
+    match = _search_by_priority(PATTERNS['length'], title)
+    if match:
+        length = match.group(match.lastgroup)
+        try:
+            length_num = float(length)
+            if length_num == int(length_num):
+                return f"length:{int(length_num)}in"
+            else:
                 return f"length:{length}in"
+        except:
+            return f"length:{length}in"
 
     return None
 
 
 def extract_capacity(title: str) -> Optional[str]:
     """Extract capacity for jars/packaging from title."""
-    title_lower = title.lower()
-
-    # ML patterns
-    ml_match = re.search(r'(\d+)\s*ml\b', title_lower)
-    if ml_match:
-        return f"capacity:{ml_match.group(1)}ml"
-
-    # OZ patterns
-    oz_match = re.search(r'(\d+)\s*oz\b', title_lower)
-    if oz_match:
-        return f"capacity:{oz_match.group(1)}oz"
+    # ML wins over OZ wherever each appears
+    match = _search_by_priority(PATTERNS['capacity'], title.lower())
+    if match:
+        return f"capacity:{match.group(match.lastgroup)}{match.lastgroup}"
 
     return None
 
 
 def extract_bundle(title: str) -> Optional[str]:
     """Extract pack/bundle size from title."""
-    title_lower = title.lower()
-
-    # Pack patterns
-    pack_patterns = [
-        (r'(\d+)\s*(?:-\s*)?pack\b', lambda m: f"bundle:{m.group(1)}-pack"),
-        (r'(\d+)\s*(?:pk|pc|pcs|pieces?|count|ct)\b', lambda m: f"bundle:{m.group(1)}-pack"),
-        (r'\bdisplay\s*(?:box|case)?\b', lambda m: "bundle:display-box"),
-        (r'\bcarton\b', lambda m: "bundle:display-box"),
-        (r'\bbulk\s*(?:case|box)?\b', lambda m: "bundle:bulk-case"),
-    ]
-
-    for pattern, handler in pack_patterns:
-        match = re.search(pattern, title_lower)
-        if match:
-            result = handler(match)
-            # Handle high counts
-            if 'bundle:' in result and '-pack' in result:
-                try:
-                    count = int(re.search(r'(\d+)', result).group(1))
-                    if count > 50:
-                        return "bundle:bulk-case"
-                    elif count > 24:
-                        return "bundle:display-box"
-                except:
-                    pass
-            return result
+    match = _search_by_priority(PATTERNS['bundle'], title.lower())
+    if not match:
+        return None
 
-    return None
+    if match.lastgroup in BUNDLE_TAGS:
+        return BUNDLE_TAGS[match.lastgroup]
+
+    # Handle high counts
+    count = match.group(match.lastgroup)
+    if int(count) > 50:
+        return "bundle:bulk-case"
+    elif int(count) > 24:
+        return "bundle:display-box"
+    return f"bundle:{count}-pack"
 
 
 def extract_styles(title: str, body: str, product_type: str) -> List[str]:
     """Extract style tags - be conservative."""
+    return _extract_styles(ProductText.from_body(title, body), product_type)
+
+
+def _extract_styles(text: ProductText, product_type: str) -> List[str]:
     styles = []
-    title_lower = title.lower()
+    title_hits = text.title_hits
     product_type_lower = product_type.lower()
 
-    # Check specification section for Made in USA
-    body_lower = body.lower() if body else ""
+    # Check specification section for Made in USA; every body check below
+    # needs one of these words
+    body_words = ('made', 'spokane', 'eugene', 'portland', 'angeles', 'diego', 'denver', 'heady')
+    body_lower = text.body_lower if text.body_may_contain(*body_words) else ""
 
     # Made in USA - check type and explicit spec mentions
     if 'made in usa' in product_type_lower:
         styles.append('style:made-in-usa')
-    elif 'usa' in title_lower and 'made' in body_lower:
+    elif 'usa' in title_hits and 'made' in body_lower:
         # Check if body explicitly mentions made in USA
-        if re.search(r'made\s+in\s+(?:the\s+)?usa', body_lower):
+        if PATTERNS['made_in_usa'].search(body_lower):
             styles.append('style:made-in-usa')
         elif 'american-made' in body_lower or 'american made' in body_lower:
             styles.append('style:made-in-usa')
@@ -475,18 +548,18 @@ def extract_styles(title: str, body: str, product_type: str) -> List[str]:
             styles.append('style:made-in-usa')
 
     # Also check for explicit origin mentions
-    if re.search(r'(?:made|crafted|built)\s+in\s+(?:spokane|eugene|portland|los angeles|san diego|denver)', body_lower):
+    if PATTERNS['usa_origin'].search(body_lower):
         if 'style:made-in-usa' not in styles:
             styles.append('style:made-in-usa')
 
     # Heady/art glass - from spec sections or title
-    if 'heady' in title_lower:
+    if 'heady' in title_hits:
         styles.append('style:heady')
-    elif 'collab' in title_lower:
+    elif 'collab' in title_hits:
         styles.append('style:heady')
     elif 'heady glass' in body_lower or 'heady dab rig' in body_lower:
         # Check category section
-        if re.search(r'category[:\s]+.*heady', body_lower):
+        if PATTERNS['heady_category'].search(body_lower):
             styles.append('style:heady')
         elif 'one-of-a-kind' in body_lower or 'one of a kind' in body_lower:
             styles.append('style:heady')
@@ -494,361 +567,88 @@ def extract_styles(title: str, body: str, product_type: str) -> List[str]:
             styles.append('style:heady')
 
     # Animal themed - only if in title
-    animal_terms = ['dragon', 'shark', 'owl', 'turtle', 'bird', 'frog', 'cat', 'dog', 'snake', 'octopus', 'fish', 'skull', 'monster', 'animal', 'dino', 'dinosaur']
-    for term in animal_terms:
-        if term in title_lower:
-            styles.append('style:animal')
-            break
+    if not title_hits.isdisjoint(ANIMAL_TERMS):
+        styles.append('style:animal')
 
     # Brand highlight (Wyn Brands type)
     if 'wyn brands' in product_type_lower:
         styles.append('style:brand-highlight')
 
     # Travel friendly - only if explicitly stated
-    if 'travel' in title_lower or 'pocket' in title_lower or 'mini' in title_lower:
+    if not title_hits.isdisjoint(TRAVEL_TERMS):
         styles.append('style:travel-friendly')
 
-    return list(set(styles))
+    return sorted(set(styles))
 
 
 def determine_family_from_content(title: str, body: str, product_type: str) -> Dict:
     """Determine family and pillar from content for theme types."""
-    title_lower = title.lower()
-    body_lower = body.lower() if body else ""
-
-    # Check title first for product type indicators
-
-    # Rigs (check first because "rig" is specific)
-    if 'rig' in title_lower or 'recycler' in title_lower:
-        if 'silicone' in title_lower:
-            return {
-                'pillar': 'pillar:smokeshop-device',
-                'family': 'family:silicone-rig',
-                'format': 'format:rig',
-                'use': ['use:dabbing'],
-            }
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:glass-rig',
-            'format': 'format:rig',
-            'use': ['use:dabbing'],
-        }
-
-    # Bongs
-    if 'bong' in title_lower or 'water pipe' in title_lower or 'waterpipe' in title_lower or 'beaker' in title_lower:
-        if 'silicone' in title_lower:
-            return {
-                'pillar': 'pillar:smokeshop-device',
-                'family': 'family:silicone-bong',
-                'format': 'format:bong',
-                'use': ['use:flower-smoking'],
-            }
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:glass-bong',
-            'format': 'format:bong',
-            'use': ['use:flower-smoking'],
-        }
-
-    # Bubblers
-    if 'bubbler' in title_lower:
-        if 'joint' in title_lower or 'pre-roll' in title_lower or 'preroll' in title_lower:
-            return {
-                'pillar': 'pillar:smokeshop-device',
-                'family': 'family:joint-bubbler',
-                'format': 'format:bubbler',
-                'use': ['use:flower-smoking', 'use:setup-protection'],
-            }
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:bubbler',
-            'format': 'format:bubbler',
-            'use': ['use:flower-smoking'],
-        }
-
-    # Hand pipes
-    if 'pipe' in title_lower or 'spoon' in title_lower or 'sherlock' in title_lower or 'steamroller' in title_lower or 'hammer' in title_lower:
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:spoon-pipe',
-            'format': 'format:pipe',
-            'use': ['use:flower-smoking'],
-        }
-
-    # Chillums/One hitters
-    if 'chillum' in title_lower or 'one hitter' in title_lower or 'one-hitter' in title_lower or 'taster' in title_lower:
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:chillum-onehitter',
-            'format': 'format:pipe',
-            'use': ['use:flower-smoking'],
-        }
-
-    # Nectar collectors
-    if 'nectar collector' in title_lower or 'honey straw' in title_lower or 'dab straw' in title_lower:
-        if 'electronic' in title_lower or 'electric' in title_lower:
-            return {
-                'pillar': 'pillar:smokeshop-device',
-                'family': 'family:electronic-nectar-collector',
-                'format': 'format:nectar-collector',
-                'use': ['use:dabbing'],
-            }
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:nectar-collector',
-            'format': 'format:nectar-collector',
-            'use': ['use:dabbing'],
-        }
+    return _determine_family(ProductText.from_body(title, body))
 
-    # Bangers
-    if 'banger' in title_lower or 'slurper' in title_lower or 'terp slurper' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:banger',
-            'format': 'format:banger',
-            'use': ['use:dabbing'],
-        }
 
-    # Carb caps
-    if 'carb cap' in title_lower or 'carbcap' in title_lower or ('cap' in title_lower and 'dab' in body_lower):
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:carb-cap',
-            'format': 'format:cap',
-            'use': ['use:dabbing'],
-        }
+def _determine_family(text: ProductText) -> Optional[Dict]:
+    return FAMILY_CLASSIFIER.classify(text, text.title_hits)
 
-    # Flower bowls
-    if 'bowl' in title_lower or 'slide' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:flower-bowl',
-            'format': 'format:accessory',
-            'use': ['use:flower-smoking'],
-        }
 
-    # Dab tools
-    if 'dab tool' in title_lower or 'dabber' in title_lower or 'tool' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:dab-tool',
-            'format': 'format:tool',
-            'use': ['use:dabbing'],
-        }
+def is_in_scope_vendor(vendor: str) -> bool:
+    """This spec only covers products whose Vendor is "What You Need"."""
+    return vendor.strip().lower() == 'what you need'
 
-    # Grinders
-    if 'grinder' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:grinder',
-            'format': 'format:grinder',
-            'use': ['use:preparation'],
-        }
 
-    # Trays - check BEFORE rolling papers since "rolling tray" contains "rolling"
-    if 'tray' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:tray',
-            'format': 'format:tray',
-            'use': ['use:rolling'],
-        }
+def generate_tags_for_product(handle: str, title: str, body_html: str, product_type: str, vendor: str, existing_tags: str,
+                              stats: Optional[Dict[str, int]] = None) -> List[str]:
+    """Generate new tags for a single product.
 
-    # Rolling papers
-    if 'paper' in title_lower or 'cone' in title_lower or 'rolling' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:rolling-paper',
-            'format': 'format:paper',
-            'use': ['use:rolling'],
-        }
+    If a stats dict is given, body_parsed or body_skipped is counted in it
+    depending on whether any extractor had to clean the body.
+    """
 
-    # Torches
-    if 'torch' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:torch',
-            'format': 'format:torch',
-            'use': ['use:dabbing'],
-        }
-
-    # Ash catchers
-    if 'ash catcher' in title_lower or 'ashcatcher' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:ash-catcher',
-            'format': 'format:accessory',
-            'use': ['use:setup-protection', 'use:flower-smoking'],
-        }
-
-    # Downstems
-    if 'downstem' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:downstem',
-            'format': 'format:accessory',
-            'use': ['use:flower-smoking'],
-        }
-
-    # Storage/Jars
-    if 'jar' in title_lower or 'stash' in title_lower or 'container' in title_lower or 'storage' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:storage-accessory',
-            'format': 'format:jar',
-            'use': ['use:storage'],
-        }
-
-    # Packaging/boxes
-    if 'box' in title_lower:
-        return {
-            'pillar': 'pillar:packaging',
-            'family': 'family:storage-accessory',
-            'format': 'format:box',
-            'use': ['use:storage'],
-        }
-
-    # Batteries/Vape
-    if 'battery' in title_lower or 'vape pen' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:vape-battery',
-            'format': 'format:battery-mod',
-            'use': ['use:dabbing'],
-        }
-
-    # Coils
-    if 'coil' in title_lower or 'atomizer' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:vape-coil',
-            'format': 'format:coil',
-            'use': ['use:dabbing'],
-        }
-
-    # Pendants - check for carb cap or pipe functionality
-    if 'pendant' in title_lower:
-        # Check if it's EXPLICITLY a carb cap pendant (must be in title or very early in description)
-        # Title must contain "carb cap" OR first 300 chars of body must explicitly say it IS a carb cap
-        is_carb_cap = False
-        if 'carb cap' in title_lower:
-            is_carb_cap = True
-        elif body_lower:
-            # Check if body explicitly says this IS a carb cap (not just comparing to one)
-            first_part = body_lower[:300]
-            if 'is a' in first_part and 'carb cap' in first_part:
-                is_carb_cap = True
-            elif 'carb cap that' in first_part or 'carb cap pendant' in first_part:
-                is_carb_cap = True
-
-        if is_carb_cap:
-            return {
-                'pillar': 'pillar:accessory',
-                'family': 'family:carb-cap',
-                'format': 'format:cap',
-                'use': ['use:dabbing'],
-            }
-        # Check if it's a pipe pendant
-        if 'pipe' in title_lower:
-            return {
-                'pillar': 'pillar:smokeshop-device',
-                'family': 'family:spoon-pipe',
-                'format': 'format:pipe',
-                'use': ['use:flower-smoking'],
-            }
-        # Check body for pipe functionality in first 300 chars
-        if body_lower and 'pipe' in body_lower[:300] and 'hand pipe' in body_lower[:400]:
-            return {
-                'pillar': 'pillar:smokeshop-device',
-                'family': 'family:spoon-pipe',
-                'format': 'format:pipe',
-                'use': ['use:flower-smoking'],
-            }
-        # Otherwise it's decorative merch
-        return {
-            'pillar': 'pillar:merch',
-            'family': 'family:merch-pendant',
-            'format': 'format:pendant',
-            'use': [],
-        }
-
-    # Matches - rolling accessory
-    if 'match' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:rolling-accessory',
-            'format': 'format:accessory',
-            'use': ['use:rolling'],
-        }
-
-    # Drop downs - similar to downstems
-    if 'drop down' in title_lower or 'dropdown' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:downstem',
-            'format': 'format:accessory',
-            'use': ['use:flower-smoking'],
-        }
+    # Only process What You Need products
+    if not is_in_scope_vendor(vendor):
+        return None
 
-    # Ashtrays - rolling trays
-    if 'ashtray' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:tray',
-            'format': 'format:tray',
-            'use': ['use:rolling'],
-        }
+    # Clean up inputs
+    title = title.strip() if title else ""
+    text = ProductText(title, body_html or "")
+    product_type = product_type.strip() if product_type else ""
 
-    # Glass cleaners - rolling accessory (general accessory)
-    if 'cleaner' in title_lower:
-        return {
-            'pillar': 'pillar:accessory',
-            'family': 'family:rolling-accessory',
-            'format': 'format:accessory',
-            'use': ['use:flower-smoking'],
-        }
+    # Get type mapping
+    type_info = TYPE_MAPPING.get(product_type.lower(), None)
 
-    # Check body for hints if nothing found in title
-    if 'dab rig' in body_lower or 'dabbing' in body_lower:
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:glass-rig',
-            'format': 'format:rig',
-            'use': ['use:dabbing'],
-        }
+    title_tags = TITLE_MEMO.lookup(('tags', title), _title_tags, text)
+    unique_tags = _product_tags(text, product_type, type_info, title_tags)
 
-    if 'hand pipe' in body_lower or 'flower pipe' in body_lower:
-        return {
-            'pillar': 'pillar:smokeshop-device',
-            'family': 'family:spoon-pipe',
-            'format': 'format:pipe',
-            'use': ['use:flower-smoking'],
-        }
+    if stats is not None:
+        key = 'body_parsed' if text.body_parsed else 'body_skipped'
+        stats[key] = stats.get(key, 0) + 1
 
-    return None
+    return unique_tags
 
 
-def generate_tags_for_product(handle: str, title: str, body_html: str, product_type: str, vendor: str, existing_tags: str) -> List[str]:
-    """Generate new tags for a single product."""
+def _title_tags(text: ProductText) -> tuple:
+    """(brand, length, capacity, bundle): the tags read from the title alone.
 
-    # Only process What You Need products
-    if vendor.strip().lower() != 'what you need':
-        return None
+    Length, capacity and bundle patterns only run on titles whose number
+    units (or, for bundle, keywords) show they can match.
+    """
+    title = text.title
+    units = text.title_units
+    return (extract_brand(title),
+            extract_length(title) if not units.isdisjoint(LENGTH_UNITS) else None,
+            extract_capacity(title) if not units.isdisjoint(CAPACITY_UNITS) else None,
+            extract_bundle(title) if not (units.isdisjoint(BUNDLE_UNITS)
+                                          and text.title_hits.isdisjoint(BUNDLE_KEYWORDS)) else None)
 
-    # Clean up inputs
-    title = title.strip() if title else ""
-    body = strip_html(body_html) if body_html else ""
-    product_type = product_type.strip() if product_type else ""
-    product_type_lower = product_type.lower()
 
+def _product_tags(text: ProductText, product_type: str, type_info: Optional[Dict],
+                  title_tags: tuple) -> List[str]:
+    """Assemble the tags for one in-scope product from its cleaned inputs."""
+    brand, length, capacity, bundle = title_tags
     tags = []
 
-    # Get type mapping
-    type_info = TYPE_MAPPING.get(product_type_lower, None)
-
     # ALWAYS check content first for products that might be miscategorized
     # (e.g., ashtray listed under Rolling Papers, matches under Essentials)
-    content_info = determine_family_from_content(title, body, product_type)
+    content_info = _determine_family(text)
 
     # For theme types or unknown types, use content info
     if type_info is None or type_info.get('pillar') is None or type_info.get('family') is None:
@@ -861,12 +661,8 @@ def generate_tags_for_product(handle: str, title: str, body_html: str, product_t
     # For functional types, override if content clearly indicates different product
     elif content_info:
         # Check if title indicates a different product type than the Shopify Type
-        title_lower = title.lower()
-        override_keywords = ['ashtray', 'rolling tray', 'tray', 'match', 'cleaner', 'drop down', 'dropdown', 'pendant']
-        for keyword in override_keywords:
-            if keyword in title_lower:
-                type_info = {**type_info, **content_info}
-                break
+        if not text.title_hits.isdisjoint(OVERRIDE_KEYWORDS):
+            type_info = {**type_info, **content_info}
 
     # If still no type_info, use default
     if not type_info or not type_info.get('pillar'):
@@ -888,12 +684,11 @@ def generate_tags_for_product(handle: str, title: str, body_html: str, product_t
         tags.append(family)
 
     # 3. Add brand (from title only)
-    brand = extract_brand(title)
     if brand:
         tags.append(brand)
 
     # 4. Add materials (from title and spec sections only)
-    materials = extract_materials_from_spec(title, body)
+    materials = _extract_materials(text)
 
     # If no materials found, use default from type
     if not materials and type_info.get('default_material'):
@@ -910,21 +705,19 @@ def generate_tags_for_product(handle: str, title: str, body_html: str, product_t
         tags.extend(type_info['use'])
 
     # 7. Add joint details
-    joint_tags = extract_joint_details(title, body)
+    joint_tags = _extract_joint_details(text)
     tags.extend(joint_tags)
 
     # 8. Add length (from title)
-    length = extract_length(title)
     if length:
         tags.append(length)
 
     # 9. Add capacity (from title)
-    capacity = extract_capacity(title)
     if capacity:
         tags.append(capacity)
 
     # 10. Add styles (conservative)
-    styles = extract_styles(title, body, product_type)
+    styles = _extract_styles(text, product_type)
 
     # Apply style overrides from type
     if type_info.get('style_override'):
@@ -935,82 +728,611 @@ def generate_tags_for_product(handle: str, title: str, body_html: str, product_t
     tags.extend(styles)
 
     # 11. Add bundle (from title)
-    bundle = extract_bundle(title)
     if bundle:
         tags.append(bundle)
 
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_tags = []
-    for tag in tags:
-        if tag and tag not in seen:
-            seen.add(tag)
-            unique_tags.append(tag)
-
-    return unique_tags
-
-
-def process_csv(input_file: str, output_file: str):
-    """Process the CSV file and generate new tags."""
-
-    with open(input_file, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        fieldnames = reader.fieldnames
-
-        rows = list(reader)
+    # Remove duplicates while preserving order; table tags come back
+    # interned, so products share one copy of each
+    return TAG_VOCABULARY.unique(tags)
+
+
+def _is_missing(value) -> bool:
+    """True for None, NaN, and pandas' NA and NaT."""
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return math.isnan(value)
+    # pd.NA compares to NA rather than to a bool, so it is matched by identity;
+    # it can only turn up once pandas has been imported
+    pandas = sys.modules.get('pandas')
+    if pandas is not None and (value is pandas.NA or value is pandas.NaT):
+        return True
+    # Other numbers, such as NumPy float32 or Decimal NaN, compare normally
+    return isinstance(value, numbers.Number) and value != value
+
+
+def _text_column(values: Iterable) -> List[str]:
+    """A column as a list of str, with missing values (None, NaN, pd.NA) as ''."""
+    return [value if isinstance(value, str) else '' if _is_missing(value) else str(value)
+            for value in values]
+
+
+def generate_tags_for_columns(titles: Iterable, bodies: Iterable, types: Iterable, vendors: Iterable,
+                              stats: Optional[Dict[str, int]] = None) -> List[Optional[List[str]]]:
+    """Generate tags for whole columns of products at once.
+
+    Takes equal-length columns (lists, tuples, NumPy arrays or pandas
+    Series) and returns what generate_tags_for_product would for each row:
+    a tag list, or None for out-of-scope vendors. Work that depends on one
+    column only is done once per distinct value: vendor checks, Type
+    lookups and the title-only extractors. Rows with the same title, body
+    and type are tagged once and share the result.
+    """
+    titles, bodies, types, vendors = (_text_column(column) for column in (titles, bodies, types, vendors))
+    if not len(titles) == len(bodies) == len(types) == len(vendors):
+        raise ValueError("titles, bodies, types and vendors must have the same length")
+
+    in_scope = {vendor: is_in_scope_vendor(vendor) for vendor in set(vendors)}
+    product_types = {product_type: product_type.strip() for product_type in set(types)}
+    type_infos = {product_type: TYPE_MAPPING.get(stripped.lower(), None)
+                  for product_type, stripped in product_types.items()}
+    stripped_titles = {}
+    title_tags = {}
+    for title, vendor in zip(titles, vendors):
+        if in_scope[vendor] and title not in title_tags:
+            stripped_titles[title] = title.strip()
+            title_tags[title] = TITLE_MEMO.lookup(('tags', stripped_titles[title]), _title_tags,
+                                                  ProductText(stripped_titles[title]))
+
+    results = []
+    tagged = {}
+    for title, body_html, product_type, vendor in zip(titles, bodies, types, vendors):
+        if not in_scope[vendor]:
+            results.append(None)
+            continue
+        key = (title, body_html, product_type)
+        tags = tagged.get(key)
+        if tags is None:
+            text = ProductText(stripped_titles[title], body_html)
+            tags = _product_tags(text, product_types[product_type], type_infos[product_type],
+                                 title_tags[title])
+            tagged[key] = tags
+            if stats is not None:
+                counter = 'body_parsed' if text.body_parsed else 'body_skipped'
+                stats[counter] = stats.get(counter, 0) + 1
+        results.append(list(tags))
+    return results
+
+
+# Functions generate_tags_for_product reaches through module globals, and the
+# names they are reported under when profiling
+_PROFILED_FUNCTIONS = {
+    'generate_tags_for_product': 'generate_tags_for_product',
+    '_unescape_lower': 'body_unescape',
+    '_strip_tags_lower': 'strip_html',
+    'strip_html': 'strip_html',
+    'extract_brand': 'extract_brand',
+    '_extract_materials': 'extract_materials_from_spec',
+    '_extract_joint_details': 'extract_joint_details',
+    'extract_length': 'extract_length',
+    'extract_capacity': 'extract_capacity',
+    'extract_bundle': 'extract_bundle',
+    '_extract_styles': 'extract_styles',
+    '_determine_family': 'determine_family_from_content',
+}
 
-    # Track unique products (by handle) to avoid reprocessing image rows
-    processed_handles = {}
-    updated_rows = []
-    products_processed = 0
 
+@contextmanager
+def _profiling(profile: TagProfile) -> Iterator[TagProfile]:
+    """Swap the tagging functions for timed wrappers while the block runs.
+
+    The originals are put back on exit, so with profiling off nothing is
+    wrapped and tagging runs at full speed.
+    """
+    namespace = globals()
+    originals = {name: namespace[name] for name in _PROFILED_FUNCTIONS}
+
+    def determine_family(text: ProductText) -> Optional[Dict]:
+        matched = FAMILY_CLASSIFIER.match(text)
+        profile.count_rule(matched[0] if matched else '(no rule)')
+        return matched[1].copy() if matched else None
+
+    try:
+        for name, label in _PROFILED_FUNCTIONS.items():
+            func = determine_family if name == '_determine_family' else originals[name]
+            namespace[name] = profile.timed(label, func)
+        yield profile
+    finally:
+        namespace.update(originals)
+
+
+def _product_args(row: Dict[str, str]) -> tuple:
+    """Arguments for generate_tags_for_product taken from a CSV row."""
+    return (
+        row.get('Handle', ''),
+        row.get('Title', ''),
+        row.get('Body (HTML)', ''),
+        row.get('Type', ''),
+        row.get('Vendor', ''),
+        row.get('Tags', ''),
+    )
+
+
+def _is_product_row(row: Dict[str, str]) -> bool:
+    """Main product rows carry a title; image/variant rows only a handle."""
+    return bool(row.get('Title', '') and row.get('Handle', ''))
+
+
+class _RawRow:
+    """A CSV row that needs no tagging, kept as its list of values.
+
+    Either an out-of-scope product row or a row without a title; the
+    only change ever made to one is blanking the Tags of an image row.
+    """
+
+    __slots__ = ('handle', 'is_product', 'values', 'tags_at')
+
+    def __init__(self, handle: str, is_product: bool, values: List[str], tags_at: Optional[int]):
+        self.handle = handle
+        self.is_product = is_product
+        self.values = values
+        self.tags_at = tags_at
+
+    def clear_tags(self):
+        if self.tags_at is not None:
+            self.values[self.tags_at] = ''
+
+
+def _row_kind(row) -> tuple:
+    """(handle, is_product_row) of a dict row or a _RawRow."""
+    if isinstance(row, _RawRow):
+        return row.handle, row.is_product
+    return row.get('Handle', ''), _is_product_row(row)
+
+
+def _tag_batch(batch: List[tuple], profile: bool = False) -> tuple:
+    """Tag a batch of products, returning (tags, stats).
+
+    Runs in worker processes in parallel mode, so the batch's counters (and
+    its profile, when profiling) travel back with its results and are
+    merged by the parent.
+    """
+    stats = {}
+    memo_before = TITLE_MEMO.stats()
+    if not profile:
+        tags = [generate_tags_for_product(*args, stats=stats) for args in batch]
+    else:
+        with _profiling(TagProfile()) as batch_profile:
+            tags = [generate_tags_for_product(*args, stats=stats) for args in batch]
+        stats['profile'] = batch_profile.data
+    for key, count in TITLE_MEMO.stats().items():
+        stats[key] = count - memo_before[key]
+    return tags, stats
+
+
+def _iter_batches(rows: Iterable[Dict[str, str]], batch_size: int) -> Iterator[tuple]:
+    """Group rows into (rows, product_args) batches of up to batch_size products.
+
+    Batches only ever split between rows, never reorder them, so image and
+    variant rows stay right behind their product row. Raw rows (see
+    _iter_csv_rows) ride along without product args.
+    """
+    batch_rows = []
+    batch_args = []
     for row in rows:
-        handle = row.get('Handle', '')
-        title = row.get('Title', '')
-        body_html = row.get('Body (HTML)', '')
-        product_type = row.get('Type', '')
-        vendor = row.get('Vendor', '')
-        existing_tags = row.get('Tags', '')
-
-        # If this is a main product row (has title), process it
-        if title and handle:
-            new_tags = generate_tags_for_product(
-                handle, title, body_html, product_type, vendor, existing_tags
-            )
-
-            if new_tags is not None:
-                # Store for this handle
-                processed_handles[handle] = ', '.join(new_tags)
-                row['Tags'] = processed_handles[handle]
-                products_processed += 1
-
-            updated_rows.append(row)
-
-        # If this is an image/variant row (no title but has handle)
-        elif handle and not title:
-            # Keep the same tags as the main product (or blank for images)
-            if handle in processed_handles:
-                row['Tags'] = ''  # Image rows typically don't need tags
-            updated_rows.append(row)
-
+        batch_rows.append(row)
+        if not isinstance(row, _RawRow) and _is_product_row(row):
+            batch_args.append(_product_args(row))
+            if len(batch_args) >= batch_size:
+                yield batch_rows, batch_args
+                batch_rows, batch_args = [], []
+    if batch_rows:
+        yield batch_rows, batch_args
+
+
+def _init_worker(title_memo_bytes: int):
+    TITLE_MEMO.resize(title_memo_bytes)
+
+
+def _iter_parallel_results(batches: Iterable[tuple], workers: int,
+                           profile: bool = False) -> Iterator[tuple]:
+    """Tag batches in a process pool, yielding (context, (tags, stats)) in input order.
+
+    Each batch is a (context, product_args) pair; the context is passed
+    through untouched. Only a bounded number of batches are in flight at
+    once, so memory stays flat however long the input is.
+    """
+    # Imported here so serial runs skip loading the process pool machinery
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Workers start with the parent's memo budget, whatever the start method
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(TITLE_MEMO.max_bytes,)) as pool:
+        pending = deque()
+        for context, batch_args in batches:
+            pending.append((context, pool.submit(_tag_batch, batch_args, profile)))
+            if len(pending) >= workers * 2:
+                context, future = pending.popleft()
+                yield context, future.result()
+        while pending:
+            context, future = pending.popleft()
+            yield context, future.result()
+
+
+def _iter_cache_misses(batches: Iterable[tuple], cache: TagCache) -> Iterator[tuple]:
+    """Look batches up in the cache, passing on only the products that missed."""
+    for batch_rows, batch_args in batches:
+        # Out-of-scope vendors are never tagged, so they are never cached
+        keys = [cache.key(*args[:5]) if is_in_scope_vendor(args[4]) else None
+                for args in batch_args]
+        found = iter(cache.get_many([key for key in keys if key is not None]))
+        cached = [next(found) if key is not None else None for key in keys]
+        missing = [args for key, args, tags in zip(keys, batch_args, cached)
+                   if key is not None and tags is None]
+        yield (batch_rows, keys, cached), missing
+
+
+def _iter_cache_merged(results: Iterable[tuple], cache: TagCache) -> Iterator[tuple]:
+    """Fill cache misses with freshly computed tags and store them."""
+    for (batch_rows, keys, cached), (computed, batch_stats) in results:
+        computed = iter(computed)
+        batch_tags = []
+        fresh = []
+        for key, tags in zip(keys, cached):
+            if key is not None and tags is None:
+                tags = next(computed)
+                fresh.append((key, tags))
+            batch_tags.append(tags)
+        if fresh:
+            cache.put_many(fresh)
+        yield batch_rows, (batch_tags, batch_stats)
+
+
+def _iter_tagged_rows(rows: Iterable[Dict[str, str]], stats: Dict[str, int],
+                      workers: int = 1, batch_size: int = DEFAULT_BATCH_SIZE,
+                      cache: Optional[TagCache] = None,
+                      profile: bool = False,
+                      delta: Optional[TagDelta] = None,
+                      tagged_handles: Optional[HandleIndex] = None,
+                      validator: Optional[TagValidator] = None,
+                      fuzzy_brands: Optional[float] = None,
+                      brand_review=None) -> Iterator[Dict[str, str]]:
+    """Tag rows batch by batch, yielding each row in input order once it is ready.
+
+    Image/variant rows of a tagged product get blank Tags. Without
+    tagged_handles they are expected to follow their product row, so only
+    the last RECENT_HANDLES product handles are remembered and rows whose
+    product is not among them are counted as rows_out_of_order; with a
+    tagged_handles index they are looked up by handle wherever they are.
+    With fuzzy_brands, products without a brand get one from
+    extract_brand_fuzzy when the match is at least that confident (see
+    _with_fuzzy_brand).
+    """
+
+    batches = _iter_batches(rows, batch_size)
+    if cache is not None:
+        batches = _iter_cache_misses(batches, cache)
+
+    if workers > 1:
+        results = _iter_parallel_results(batches, workers, profile)
+    else:
+        results = ((context, _tag_batch(batch_args, profile)) for context, batch_args in batches)
+
+    if cache is not None:
+        results = _iter_cache_merged(results, cache)
+
+    # handle -> whether it was tagged, for the most recent product rows
+    recent_handles = OrderedDict()
+
+    for batch_rows, (batch_tags, batch_stats) in results:
+        merge_counts(stats, batch_stats)
+        if tagged_handles is not None:
+            batch_tagged = tagged_handles.contains_many(
+                handle for handle, is_product in map(_row_kind, batch_rows) if handle and not is_product)
+        batch_tags = iter(batch_tags)
+        for row in batch_rows:
+            handle, is_product = _row_kind(row)
+
+            # If this is a main product row (has title), apply its tags
+            if is_product:
+                # Raw product rows are out of scope and never tagged
+                new_tags = None if isinstance(row, _RawRow) else next(batch_tags)
+                recent_handles[handle] = recent_handles.pop(handle, False) or new_tags is not None
+                if len(recent_handles) > RECENT_HANDLES:
+                    recent_handles.popitem(last=False)
+
+                if new_tags is not None:
+                    if fuzzy_brands is not None:
+                        new_tags = _with_fuzzy_brand(handle, row.get('Title', ''), new_tags, stats,
+                                                     fuzzy_brands, brand_review)
+                    if delta is not None:
+                        delta.add(handle, row.get('Tags', ''), new_tags)
+                    if validator is not None:
+                        validator.check(handle, new_tags)
+                    row['Tags'] = ', '.join(new_tags)
+                    stats['products_processed'] += 1
+
+            # If this is an image/variant row (no title but has handle)
+            elif handle:
+                # Keep the same tags as the main product (or blank for images)
+                if tagged_handles is not None:
+                    tagged = handle in batch_tagged
+                elif handle not in recent_handles:
+                    stats['rows_out_of_order'] = stats.get('rows_out_of_order', 0) + 1
+                    tagged = False
+                else:
+                    tagged = recent_handles[handle]
+                if tagged:
+                    # Image rows typically don't need tags
+                    if isinstance(row, _RawRow):
+                        row.clear_tags()
+                    else:
+                        row['Tags'] = ''
+
+            # Anything else is kept as-is
+            yield row
+
+
+def _with_fuzzy_brand(handle: str, title: str, tags: List[str], stats: Dict[str, int],
+                      min_confidence: float, review=None) -> List[str]:
+    """tags with a fuzzily matched brand added after pillar and family, if they have no brand.
+
+    Matches less confident than min_confidence are not added; they are
+    counted and, given a review csv.writer, written there for a person to check.
+    """
+    if any(tag.startswith('brand:') for tag in tags):
+        return tags
+    match = extract_brand_fuzzy(title.strip())
+    if match is None:
+        return tags
+    if match.confidence < min_confidence:
+        stats['fuzzy_brands_review'] = stats.get('fuzzy_brands_review', 0) + 1
+        if review is not None:
+            review.writerow([handle, title, match.tag, f'{match.confidence:.2f}', match.text])
+        return tags
+    stats['fuzzy_brands_added'] = stats.get('fuzzy_brands_added', 0) + 1
+    at = sum(1 for tag in tags[:2] if tag.startswith(('pillar:', 'family:')))
+    return tags[:at] + [TAG_VOCABULARY.intern(match.tag)] + tags[at:]
+
+
+def _iter_csv_rows(reader, fieldnames: List[str]) -> Iterator:
+    """csv.DictReader's rows, built from a csv.reader, with a vendor prefilter.
+
+    Only in-scope product rows are ever tagged, so only those are turned
+    into the dict DictReader would build. Product rows of other vendors and rows without a title skip the
+    dict and come out as a _RawRow. Rows of the wrong length always become
+    dicts, so they fail or pass exactly as they would with DictReader.
+    """
+    size = len(fieldnames)
+    if {'Handle', 'Title', 'Vendor'}.issubset(fieldnames):
+        handle_at = fieldnames.index('Handle')
+        title_at = fieldnames.index('Title')
+        vendor_at = fieldnames.index('Vendor')
+        tags_at = fieldnames.index('Tags') if 'Tags' in fieldnames else None
+    else:
+        size = -1  # nothing to filter on: build every row
+    # Vendor -> in scope; a catalog only has a handful of vendors
+    in_scope = {}
+
+    for values in reader:
+        if len(values) == size:
+            if not values[title_at]:
+                yield _RawRow(values[handle_at], False, values, tags_at)
+                continue
+            vendor = values[vendor_at]
+            if vendor not in in_scope:
+                in_scope[vendor] = is_in_scope_vendor(vendor)
+            if not in_scope[vendor]:
+                handle = values[handle_at]
+                yield _RawRow(handle, bool(handle), values, tags_at)
+                continue
+        elif not values:
+            # DictReader skips blank lines
+            continue
+
+        row = dict(zip(fieldnames, values))
+        if len(values) > len(fieldnames):
+            row[None] = values[len(fieldnames):]
+        elif len(values) < len(fieldnames):
+            for name in fieldnames[len(values):]:
+                row[name] = None
+        yield row
+
+
+def _open_rows(path: str, files: ExitStack, columns: Optional[List[str]] = None) -> tuple:
+    """(fieldnames, rows) of a CSV export, or of a Parquet/Arrow file by extension.
+
+    CSV rows go through the vendor prefilter of _iter_csv_rows. Of a
+    Parquet/Arrow file only `columns` are read (every column if None).
+    """
+    if columnar_format(path):
+        return files.enter_context(read_columnar(path, columns))
+    reader = csv.reader(files.enter_context(open(path, 'r', encoding='utf-8')))
+    fieldnames = next(reader, None)
+    return fieldnames, _iter_csv_rows(reader, fieldnames or [])
+
+
+def _index_tagged_handles(input_file: str, index: HandleIndex):
+    """First pass of unordered mode: index the handle of every product that will be tagged."""
+    with ExitStack() as files:
+        _, rows = _open_rows(input_file, files, TAGGER_COLUMNS)
+        index.add_many(row['Handle'] for row in rows
+                       if not isinstance(row, _RawRow) and _is_product_row(row)
+                       and is_in_scope_vendor(row.get('Vendor', '')))
+
+
+def _open_writer(path: str, fieldnames: List[str], files: ExitStack) -> tuple:
+    """(dict row writer, list row writer) for a CSV, Parquet or Arrow output path."""
+    if columnar_format(path):
+        if 'Tags' not in fieldnames:
+            fieldnames = list(fieldnames) + ['Tags']
+        writer = files.enter_context(ColumnarWriter(path, fieldnames))
+
+        def write_values(values):
+            writer.writerow(dict(zip(fieldnames, values)))
+
+        return writer, write_values
+    outfile = files.enter_context(open(path, 'w', encoding='utf-8', newline=''))
+    # Both write to the same file handle, in call order
+    return csv.DictWriter(outfile, fieldnames=fieldnames), csv.writer(outfile).writerow
+
+
+def _write_rows(writer, write_values, rows: Iterable):
+    """Write tagged rows; raw rows go out as their list of values."""
+    for row in rows:
+        if isinstance(row, _RawRow):
+            write_values(row.values)
         else:
-            # Keep row as-is
-            updated_rows.append(row)
-
-    # Write output
-    with open(output_file, 'w', encoding='utf-8', newline='') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(updated_rows)
-
+            writer.writerow(row)
+
+
+def process_csv(input_file: str, output_file: str, workers: int = 1,
+                batch_size: int = DEFAULT_BATCH_SIZE, cache_file: Optional[str] = None,
+                profile: bool = False, profile_json: Optional[str] = None,
+                delta_file: Optional[str] = None, previous_file: Optional[str] = None,
+                title_memo_bytes: Optional[int] = None, unordered: bool = False,
+                validate: bool = False, fuzzy_brands: Optional[float] = None,
+                brand_review_file: Optional[str] = None):
+    """Process the CSV file and generate new tags.
+
+    Rows are streamed straight from the reader, through the tagger and into
+    the writer, so memory use stays flat no matter how large the export is.
+    Either file may be Parquet or Arrow IPC instead (see tag_io). The other
+    arguments switch on the matching options of main(); see its --help.
+    """
+
+    if os.path.abspath(input_file) == os.path.abspath(output_file):
+        raise ValueError("input_file and output_file must be different files")
+
+    profile = profile or bool(profile_json)
+    if title_memo_bytes is not None:
+        TITLE_MEMO.resize(title_memo_bytes)
+    stats = {'products_processed': 0}
+    cache = TagCache(cache_file, RULESET_VERSION) if cache_file else None
+    delta = None
+    if delta_file:
+        previous = load_previous_tags(previous_file) if previous_file else None
+        delta = TagDelta(delta_file, previous)
+    validator = TagValidator((TYPE_MAPPING, FAMILY_PROFILES)) if validate else None
+
+    try:
+        with ExitStack() as files:
+            tagged_handles = None
+            if unordered:
+                tagged_handles = files.enter_context(HandleIndex())
+                _index_tagged_handles(input_file, tagged_handles)
+            fieldnames, reader = _open_rows(input_file, files)
+            writer, write_values = _open_writer(output_file, fieldnames, files)
+            writer.writeheader()
+            brand_review = None
+            if brand_review_file:
+                brand_review = csv.writer(files.enter_context(
+                    open(brand_review_file, 'w', encoding='utf-8', newline='')))
+                brand_review.writerow(BRAND_REVIEW_FIELDNAMES)
+            _write_rows(writer, write_values,
+                        _iter_tagged_rows(reader, stats, workers=workers, batch_size=batch_size,
+                                          cache=cache, profile=profile, delta=delta,
+                                          tagged_handles=tagged_handles, validator=validator,
+                                          fuzzy_brands=fuzzy_brands, brand_review=brand_review))
+    finally:
+        if cache is not None:
+            cache.close()
+        if delta is not None:
+            delta.close()
+
+    products_processed = stats['products_processed']
     print(f"Processed {products_processed} products")
+    if stats.get('body_parsed') or stats.get('body_skipped'):
+        print(f"Body HTML: {stats.get('body_parsed', 0)} parsed, "
+              f"{stats.get('body_skipped', 0)} skipped")
+    if stats.get('title_memo_hits') or stats.get('title_memo_misses'):
+        print(f"Title memo: {stats['title_memo_hits']} hits, {stats['title_memo_misses']} misses, "
+              f"{stats['title_memo_evictions']} evictions")
+    if stats.get('rows_out_of_order'):
+        print(f"{stats['rows_out_of_order']} image/variant rows were not found near their product row; "
+              f"rerun with --unordered to match them up by handle")
+    if cache is not None:
+        print(f"Tag cache: {cache.hits} reused, {cache.misses} re-tagged")
+    if fuzzy_brands is not None:
+        print(f"Fuzzy brands: {stats.get('fuzzy_brands_added', 0)} added, "
+              f"{stats.get('fuzzy_brands_review', 0)} below {fuzzy_brands:g} confidence left out"
+              + (f" (listed in {brand_review_file})" if brand_review_file else ""))
     print(f"Output written to: {output_file}")
+    if delta is not None:
+        print(delta.summary())
+    if validator is not None:
+        print(validator.summary())
+
+    if profile:
+        report = TagProfile()
+        report.merge(stats.get('profile', {}))
+        print()
+        print(report.summary())
+        if profile_json:
+            with open(profile_json, 'w', encoding='utf-8') as handle:
+                json.dump(report.to_dict(), handle, indent=2)
+            print(f"Profile written to: {profile_json}")
 
     return products_processed
 
 
-if __name__ == '__main__':
-    input_csv = '/home/user/Shopify-Products-Optimizer/WYN PRODUCT EXPORT.csv'
-    output_csv = '/home/user/Shopify-Products-Optimizer/WYN_PRODUCT_EXPORT_TAGGED.csv'
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate spec tags for What You Need products.")
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT_CSV,
+                        help='Shopify product export CSV, or a .parquet/.arrow copy of it')
+    parser.add_argument('output', nargs='?', default=DEFAULT_OUTPUT_CSV,
+                        help='where to write the tagged CSV (or .parquet/.arrow)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='tag products in N worker processes (default: 1)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='products per batch sent to a worker')
+    parser.add_argument('--cache', metavar='PATH',
+                        help='SQLite tag cache; unchanged products reuse their stored tags')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each extractor and count family rule hits')
+    parser.add_argument('--profile-json', metavar='PATH',
+                        help='also write the profile to PATH as JSON (implies --profile)')
+    parser.add_argument('--delta', metavar='PATH',
+                        help='also write a Handle,Tags import of only the products whose tags changed')
+    parser.add_argument('--previous', metavar='PATH',
+                        help='with --delta, compare against this earlier output instead of the Tags column')
+    parser.add_argument('--title-memo-mb', type=float, default=DEFAULT_TITLE_MEMO_BYTES / 2**20,
+                        help='memory budget of the title-only extractor memo in MB; 0 turns it off '
+                             '(default: %(default)g)')
+    parser.add_argument('--unordered', action='store_true',
+                        help="image/variant rows may be anywhere in the file, not right after "
+                             "their product row (reads the input twice)")
+    parser.add_argument('--fuzzy-brands', action='store_true',
+                        help='give products without a brand one matched despite typos or spacing')
+    parser.add_argument('--fuzzy-brand-confidence', type=float, metavar='FLOAT',
+                        help='with --fuzzy-brands, the least confidence (0 to 1) at which a match is '
+                             f'added (default: {DEFAULT_FUZZY_BRAND_CONFIDENCE:g})')
+    parser.add_argument('--brand-review', metavar='PATH',
+                        help='with --fuzzy-brands, list the matches too weak to add in PATH')
+    parser.add_argument('--validate', action='store_true',
+                        help='check every product\'s new tags against the tag spec and report violations')
+    args = parser.parse_args(argv)
+    if args.previous and not args.delta:
+        parser.error('--previous requires --delta')
+    if args.brand_review and not args.fuzzy_brands:
+        parser.error('--brand-review requires --fuzzy-brands')
+    if args.fuzzy_brand_confidence is not None:
+        if not args.fuzzy_brands:
+            parser.error('--fuzzy-brand-confidence requires --fuzzy-brands')
+        if not 0 <= args.fuzzy_brand_confidence <= 1:
+            parser.error('--fuzzy-brand-confidence must be between 0 and 1')
+    fuzzy_brands = None
+    if args.fuzzy_brands:
+        fuzzy_brands = (DEFAULT_FUZZY_BRAND_CONFIDENCE if args.fuzzy_brand_confidence is None
+                        else args.fuzzy_brand_confidence)
+
+    process_csv(args.input, args.output, workers=args.workers, batch_size=args.batch_size,
+                cache_file=args.cache, profile=args.profile, profile_json=args.profile_json,
+                delta_file=args.delta, previous_file=args.previous,
+                title_memo_bytes=int(args.title_memo_mb * 2**20), unordered=args.unordered,
+                validate=args.validate, fuzzy_brands=fuzzy_brands,
+                brand_review_file=args.brand_review)
 
-    process_csv(input_csv, output_csv)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Shopify GraphQL Admin API, for exercising shopify_writer.py.
+
+Answers the two aliased documents the writer sends (productByIdentifier
+lookups and productUpdate mutations), keeps each product's tags in memory,
+and models Shopify's cost throttling: a leaky bucket of points that
+requests draw from, THROTTLED errors when a request costs more than is
+available, and throttleStatus in every response. Transient failures (502s
+and dropped connections) can be injected at a given rate.
+
+Usage:
+    python mock_shopify.py [--port 8766] [--handles tagged.csv] [--restore-rate 50] [--fail-rate 0.05]
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+
+from shopify_writer import iter_tag_updates
+
+LOOKUP_COST = 1
+UPDATE_COST = 10
+
+_LOOKUP = re.compile(r'(\w+): productByIdentifier\(identifier: \{handle: \$(\w+)\}\)')
+_UPDATE = re.compile(r'(\w+): productUpdate\(product: \$(\w+)\)')
+
+
+class MockShop:
+    """Products, their tags, and the cost bucket of one mock shop."""
+
+    def __init__(self, handles: Optional[Iterable[str]] = None, capacity: float = 1000.0,
+                 restore_rate: float = 50.0, fail_rate: float = 0.0, seed: int = 0):
+        self.capacity = capacity
+        self.restore_rate = restore_rate
+        self.fail_rate = fail_rate
+        self.available = capacity
+        self.products = {}
+        self.handles_by_id = {}
+        self.tags = {}
+        self.requests = 0
+        self.throttled = 0
+        self.failures = 0
+        self._updated = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # None means every handle exists
+        self.known_handles = set(handles) if handles is not None else None
+
+    def _product_id(self, handle: str) -> Optional[str]:
+        if self.known_handles is not None and handle not in self.known_handles:
+            return None
+        if handle not in self.products:
+            product_id = f'gid://shopify/Product/{len(self.products) + 1}'
+            self.products[handle] = product_id
+            self.handles_by_id[product_id] = handle
+        return self.products[handle]
+
+    def _throttle_status(self) -> Dict:
+        return {'maximumAvailable': self.capacity, 'currentlyAvailable': int(self.available),
+                'restoreRate': self.restore_rate}
+
+    def injected_failure(self) -> Optional[str]:
+        """'drop', '502' or None for the next request, at fail_rate."""
+        with self._lock:
+            if not self.fail_rate or self._random.random() >= self.fail_rate:
+                return None
+            self.failures += 1
+            return self._random.choice(('drop', '502'))
+
+    def execute(self, query: str, variables: Dict) -> Dict:
+        lookups = _LOOKUP.findall(query)
+        updates = _UPDATE.findall(query)
+        cost = LOOKUP_COST * len(lookups) + UPDATE_COST * len(updates)
+
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self._updated) * self.restore_rate)
+            self._updated = now
+            if cost > self.available:
+                self.throttled += 1
+                return {
+                    'errors': [{'message': 'Throttled', 'extensions': {'code': 'THROTTLED'}}],
+                    'extensions': {'cost': {'requestedQueryCost': cost, 'actualQueryCost': None,
+                                            'throttleStatus': self._throttle_status()}},
+                }
+            self.available -= cost
+
+            data = {}
+            for alias, variable in lookups:
+                product_id = self._product_id(variables[variable])
+                data[alias] = {'id': product_id} if product_id else None
+            for alias, variable in updates:
+                product = variables[variable]
+                handle = self.handles_by_id.get(product.get('id'))
+                if handle is None:
+                    data[alias] = {'product': None,
+                                   'userErrors': [{'field': ['id'], 'message': 'Product does not exist'}]}
+                else:
+                    self.tags[handle] = list(product.get('tags', []))
+                    data[alias] = {'product': {'id': product['id']}, 'userErrors': []}
+
+            return {'data': data,
+                    'extensions': {'cost': {'requestedQueryCost': cost, 'actualQueryCost': cost,
+                                            'throttleStatus': self._throttle_status()}}}
+
+
+class MockShopifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    shop = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        failure = self.shop.injected_failure()
+        if failure == 'drop':
+            # Close the connection without answering
+            self.close_connection = True
+            return
+        if failure == '502':
+            self._send(502, {'errors': 'Bad Gateway'})
+            return
+        try:
+            payload = json.loads(body)
+            result = self.shop.execute(payload['query'], payload.get('variables') or {})
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send(400, {'errors': [{'message': f'bad request: {exc}'}]})
+            return
+        self._send(200, result)
+
+    def _send(self, status: int, body: Dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(shop: MockShop, host: str = '127.0.0.1', port: int = 8766) -> ThreadingHTTPServer:
+    handler = type('Handler', (MockShopifyHandler,), {'shop': shop})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run a mock Shopify GraphQL Admin API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--handles', metavar='CSV',
+                        help='only these handles exist (default: every handle exists)')
+    parser.add_argument('--capacity', type=float, default=1000.0, help='cost bucket size in points')
+    parser.add_argument('--restore-rate', type=float, default=50.0, help='points restored per second')
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help='fraction of requests answered with a 502 or a dropped connection')
+    args = parser.parse_args(argv)
+
+    handles = [handle for handle, _ in iter_tag_updates(args.handles)] if args.handles else None
+    shop = MockShop(handles, args.capacity, args.restore_rate, args.fail_rate)
+    server = make_server(shop, args.host, args.port)
+    print(f"Mock Shopify on http://{args.host}:{server.server_port}/graphql.json")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"{shop.requests} requests, {shop.throttled} throttled, {shop.failures} failed; "
+              f"{len(shop.tags)} products updated")
+
+
+if __name__ == '__main__':
+    main()
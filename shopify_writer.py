@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Push tag updates straight to Shopify over the GraphQL Admin API.
+
+Reads a Handle,Tags file (the --delta output of generate_tags.py, or a full
+tagged export) and sets each product's tags, instead of going through the
+CSV importer by hand:
+
+  - handles are resolved to product IDs with aliased productByIdentifier
+    queries, and tags are set with aliased productUpdate mutations, a batch
+    of products per request;
+  - requests run concurrently on a pool of keep-alive HTTPS connections;
+  - a local token bucket mirrors Shopify's query cost bucket, synced from
+    every response's throttleStatus, so requests wait for points instead of
+    being throttled;
+  - throttled requests, 429s, 5xx and connection errors are retried with
+    exponential backoff and jitter.
+
+Products that could not be updated are reported, and can be written to a
+Handle,Tags,Error CSV to re-run.
+
+Usage:
+    SHOPIFY_ACCESS_TOKEN=... python shopify_writer.py changed.csv --shop example.myshopify.com
+    python shopify_writer.py changed.csv --endpoint http://127.0.0.1:8766/graphql.json  # mock_shopify.py
+"""
+
+import argparse
+import asyncio
+import csv
+import http.client
+import json
+import os
+import queue
+import random
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from tag_delta import parse_tags
+
+API_VERSION = '2025-01'
+
+# Products per request; 25 updates stay well under the 1000-point query limit
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 6
+
+# Backoff before retry n is min(cap, base * 2**n) seconds, scaled by jitter
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+# Query cost guesses until the first response reports real ones
+INITIAL_COST_PER_LOOKUP = 1
+INITIAL_COST_PER_UPDATE = 10
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ShopifyError(Exception):
+    """A request that failed for good: a GraphQL error, or retries ran out."""
+
+
+def iter_tag_updates(path: str) -> Iterator[Tuple[str, List[str]]]:
+    """(handle, tags) for each product in a Handle,Tags CSV or a tagged export."""
+    with open(path, 'r', encoding='utf-8', newline='') as infile:
+        reader = csv.DictReader(infile)
+        has_title = 'Title' in (reader.fieldnames or [])
+        for row in reader:
+            if not row.get('Handle') or (has_title and not row.get('Title')):
+                continue
+            yield row['Handle'], parse_tags(row.get('Tags', ''))
+
+
+class TokenBucket:
+    """Client-side copy of Shopify's leaky bucket of query cost points."""
+
+    def __init__(self, capacity: float = 1000.0, restore_rate: float = 50.0):
+        self.capacity = capacity
+        self.restore_rate = restore_rate
+        self.available = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.restore_rate)
+        self._updated = now
+
+    async def acquire(self, cost: float) -> float:
+        """Wait until cost points are available and take them; returns the seconds waited."""
+        cost = min(cost, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.available < cost:
+                delay = (cost - self.available) / self.restore_rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.available -= cost
+        return waited
+
+    def sync(self, throttle_status: Dict):
+        """Adopt the server's view of the bucket from a response's throttleStatus."""
+        self.capacity = float(throttle_status.get('maximumAvailable', self.capacity))
+        self.restore_rate = float(throttle_status.get('restoreRate', self.restore_rate))
+        self.available = float(throttle_status.get('currentlyAvailable', self.available))
+        self._updated = time.monotonic()
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one GraphQL endpoint, used from worker threads."""
+
+    def __init__(self, url: str, headers: Dict[str, str], size: int, timeout: float = 60.0):
+        parts = urlsplit(url)
+        self._connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                  else http.client.HTTPConnection)
+        self._host = parts.netloc
+        self._path = parts.path or '/'
+        self._headers = headers
+        self._timeout = timeout
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    def post(self, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        """POST body on a pooled connection; returns (status, headers, response body)."""
+        connection = self._idle.get()
+        try:
+            if connection is None:
+                connection = self._connection_class(self._host, timeout=self._timeout)
+            connection.request('POST', self._path, body, self._headers)
+            response = connection.getresponse()
+            data = response.read()
+            headers = {name.lower(): value for name, value in response.getheaders()}
+            if response.will_close:
+                connection.close()
+                connection = None
+            return response.status, headers, data
+        except (OSError, http.client.HTTPException):
+            if connection is not None:
+                connection.close()
+            connection = None
+            raise
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        while not self._idle.empty():
+            connection = self._idle.get_nowait()
+            if connection is not None:
+                connection.close()
+
+
+def _json_object(data: bytes) -> Optional[Dict]:
+    """The JSON object in a response body, or None if the body is not one."""
+    try:
+        result = json.loads(data)
+    except ValueError:
+        return None
+    return result if isinstance(result, dict) else None
+
+
+def _lookup_document(count: int) -> str:
+    variables = ', '.join(f'$h{i}: String!' for i in range(count))
+    fields = ' '.join(f'h{i}: productByIdentifier(identifier: {{handle: $h{i}}}) {{ id }}'
+                      for i in range(count))
+    return f'query LookupProducts({variables}) {{ {fields} }}'
+
+
+def _update_document(count: int) -> str:
+    variables = ', '.join(f'$p{i}: ProductUpdateInput!' for i in range(count))
+    fields = ' '.join(f'p{i}: productUpdate(product: $p{i}) {{ product {{ id }} userErrors {{ field message }} }}'
+                      for i in range(count))
+    return f'mutation UpdateTags({variables}) {{ {fields} }}'
+
+
+class ShopifyWriter:
+    """Sets product tags through the GraphQL Admin API, batched and throttled."""
+
+    def __init__(self, url: str, access_token: str = '', concurrency: int = DEFAULT_CONCURRENCY,
+                 batch_size: int = DEFAULT_BATCH_SIZE, max_retries: int = DEFAULT_MAX_RETRIES):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if access_token:
+            headers['X-Shopify-Access-Token'] = access_token
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.bucket = TokenBucket()
+        self._pool = ConnectionPool(url, headers, concurrency)
+        self._cost_per = {'lookup': INITIAL_COST_PER_LOOKUP, 'update': INITIAL_COST_PER_UPDATE}
+        self._product_ids = {}
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'throttle_wait_s': 0.0}
+
+    @classmethod
+    def for_shop(cls, shop: str, access_token: str, **kwargs) -> 'ShopifyWriter':
+        return cls(f'https://{shop}/admin/api/{API_VERSION}/graphql.json', access_token, **kwargs)
+
+    def close(self):
+        self._pool.close()
+
+    async def _graphql(self, kind: str, count: int, query: str, variables: Dict) -> Dict:
+        """Run one aliased request of `count` operations, retrying and throttling."""
+        body = json.dumps({'query': query, 'variables': variables}).encode('utf-8')
+        for attempt in range(self.max_retries + 1):
+            self.stats['throttle_wait_s'] += await self.bucket.acquire(self._cost_per[kind] * count)
+            self.stats['requests'] += 1
+            retry_after = None
+            try:
+                status, headers, data = await asyncio.to_thread(self._pool.post, body)
+            except (OSError, http.client.HTTPException) as exc:
+                error = f'connection error: {exc}'
+            else:
+                if status in RETRY_STATUSES:
+                    error = f'HTTP {status}'
+                    retry_after = headers.get('retry-after')
+                elif status != 200:
+                    raise ShopifyError(f'HTTP {status}: {data[:200].decode("utf-8", "replace")}')
+                else:
+                    result = _json_object(data)
+                    if result is None:
+                        # A proxy or maintenance page served with a 200: retry it like a 502
+                        error = f'HTTP 200 without a JSON body: {data[:200].decode("utf-8", "replace")}'
+                    else:
+                        cost = result.get('extensions', {}).get('cost', {})
+                        if cost.get('throttleStatus'):
+                            self.bucket.sync(cost['throttleStatus'])
+                        if cost.get('requestedQueryCost') and count:
+                            self._cost_per[kind] = cost['requestedQueryCost'] / count
+                        errors = result.get('errors') or []
+                        if any(e.get('extensions', {}).get('code') == 'THROTTLED' for e in errors):
+                            # The bucket was just synced, so the next acquire waits long enough
+                            self.stats['throttled'] += 1
+                            continue
+                        if errors:
+                            raise ShopifyError('; '.join(e.get('message', str(e)) for e in errors))
+                        return result.get('data') or {}
+
+            if attempt == self.max_retries:
+                raise ShopifyError(f'{error} (gave up after {attempt + 1} attempts)')
+            self.stats['retries'] += 1
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            await asyncio.sleep(delay)
+        raise ShopifyError(f'still throttled after {self.max_retries + 1} attempts')
+
+    async def _lookup_ids(self, handles: List[str]):
+        missing = [handle for handle in handles if handle not in self._product_ids]
+        if not missing:
+            return
+        data = await self._graphql('lookup', len(missing), _lookup_document(len(missing)),
+                                   {f'h{i}': handle for i, handle in enumerate(missing)})
+        for i, handle in enumerate(missing):
+            product = data.get(f'h{i}')
+            self._product_ids[handle] = product['id'] if product else None
+
+    async def _push_batch(self, batch: List[Tuple[str, List[str]]], result: Dict):
+        try:
+            await self._lookup_ids([handle for handle, _ in batch])
+            found = [(handle, tags) for handle, tags in batch if self._product_ids[handle]]
+            result['not_found'].extend((handle, tags) for handle, tags in batch
+                                       if not self._product_ids[handle])
+            if not found:
+                return
+            data = await self._graphql(
+                'update', len(found), _update_document(len(found)),
+                {f'p{i}': {'id': self._product_ids[handle], 'tags': tags}
+                 for i, (handle, tags) in enumerate(found)})
+        except ShopifyError as exc:
+            result['failed'].extend((handle, tags, str(exc)) for handle, tags in batch
+                                    if self._product_ids.get(handle, True))
+            return
+
+        for i, (handle, tags) in enumerate(found):
+            outcome = data.get(f'p{i}') or {}
+            user_errors = outcome.get('userErrors') or []
+            if user_errors or not outcome.get('product'):
+                message = '; '.join(e.get('message', '') for e in user_errors) or 'no product returned'
+                result['failed'].append((handle, tags, message))
+            else:
+                result['updated'] += 1
+
+    async def push(self, updates: Iterable[Tuple[str, List[str]]]) -> Dict:
+        """Set tags for every (handle, tags); returns updated/not_found/failed and request stats.
+
+        not_found holds (handle, tags) and failed (handle, tags, error), so either
+        can be pushed again as is.
+        """
+        result = {'updated': 0, 'not_found': [], 'failed': []}
+        batches = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker():
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    return
+                try:
+                    await self._push_batch(batch, result)
+                except Exception as exc:
+                    # Fail this batch, not the worker: a dead worker would leave
+                    # the loop below waiting forever to put batches on the queue
+                    result['failed'].extend((handle, tags, f'unexpected error: {exc!r}')
+                                            for handle, tags in batch)
+
+        started = time.monotonic()
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        batch = []
+        for update in updates:
+            batch.append(update)
+            if len(batch) >= self.batch_size:
+                await batches.put(batch)
+                batch = []
+        if batch:
+            await batches.put(batch)
+        for _ in workers:
+            await batches.put(None)
+        await asyncio.gather(*workers)
+
+        result.update(self.stats)
+        result['elapsed_s'] = time.monotonic() - started
+        return result
+
+
+def push_tags(updates: Iterable[Tuple[str, List[str]]], url: str, access_token: str = '',
+              **kwargs) -> Dict:
+    """Blocking wrapper around ShopifyWriter.push."""
+    writer = ShopifyWriter(url, access_token, **kwargs)
+    try:
+        return asyncio.run(writer.push(updates))
+    finally:
+        writer.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Set product tags in Shopify from a Handle,Tags CSV.")
+    parser.add_argument('input', help='Handle,Tags CSV (generate_tags.py --delta output) or a tagged export')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--shop', help='shop domain, e.g. example.myshopify.com')
+    target.add_argument('--endpoint', help='full GraphQL URL instead of --shop (e.g. a mock server)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='requests in flight at once (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='products per request (default: %(default)s)')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument('--failures', metavar='PATH',
+                        help='write products that could not be updated to a Handle,Tags,Error CSV')
+    args = parser.parse_args(argv)
+
+    token = os.environ.get('SHOPIFY_ACCESS_TOKEN', '')
+    if args.shop and not token:
+        parser.error('set SHOPIFY_ACCESS_TOKEN to an Admin API access token')
+    url = args.endpoint or f'https://{args.shop}/admin/api/{API_VERSION}/graphql.json'
+
+    result = push_tags(iter_tag_updates(args.input), url, token, concurrency=args.concurrency,
+                       batch_size=args.batch_size, max_retries=args.max_retries)
+    print(f"Updated {result['updated']} products in {result['elapsed_s']:.1f}s "
+          f"({result['requests']} requests, {result['retries']} retries, "
+          f"{result['throttled']} throttled, {result['throttle_wait_s']:.1f}s waiting for cost points)")
+    if result['not_found']:
+        print(f"{len(result['not_found'])} handles not found in the shop")
+    if result['failed']:
+        print(f"{len(result['failed'])} products failed, e.g. {result['failed'][0][0]}: {result['failed'][0][2]}")
+    if args.failures:
+        with open(args.failures, 'w', encoding='utf-8', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(['Handle', 'Tags', 'Error'])
+            for handle, tags in result['not_found']:
+                writer.writerow([handle, ', '.join(tags), 'not found'])
+            for handle, tags, error in result['failed']:
+                writer.writerow([handle, ', '.join(tags), error])
+        print(f"Failures written to: {args.failures}")
+    if result['not_found'] or result['failed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Persistent tag cache for incremental re-tagging.
+
+Tags are stored per handle together with a hash of everything that can
+change them: Title, Body (HTML), Type, Vendor and the ruleset version. A
+product whose hash still matches reuses its stored tags; anything new or
+edited, or every product after a rule change, misses and is re-tagged.
+"""
+
+import hashlib
+import json
+import sqlite3
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_MAX_PARAMS = 900
+
+
+def select_in(conn: sqlite3.Connection, query: str, values: List) -> Iterator[tuple]:
+    """Rows of query for every value, run over chunks of values small enough to bind.
+
+    query has one '{}' where the comma-separated placeholders of an
+    'IN ({})' list go.
+    """
+    for start in range(0, len(values), _MAX_PARAMS):
+        chunk = values[start:start + _MAX_PARAMS]
+        yield from conn.execute(query.format(','.join('?' * len(chunk))), chunk)
+
+
+def content_hash(title: str, body_html: str, product_type: str, vendor: str,
+                 ruleset_version: str) -> str:
+    """Hash of the product fields that feed the tagger, plus the ruleset."""
+    digest = hashlib.blake2b(digest_size=16)
+    for field in (ruleset_version, title, body_html, product_type, vendor):
+        digest.update((field or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class TagCache:
+    """SQLite-backed handle -> (content hash, tags) store."""
+
+    def __init__(self, path: str, ruleset_version: str):
+        self.path = path
+        self.ruleset_version = ruleset_version
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS product_tags ('
+            ' handle TEXT PRIMARY KEY,'
+            ' content_hash TEXT NOT NULL,'
+            ' tags TEXT NOT NULL)'
+        )
+
+    def key(self, handle: str, title: str, body_html: str, product_type: str,
+            vendor: str) -> Tuple[str, str]:
+        return handle, content_hash(title, body_html, product_type, vendor, self.ruleset_version)
+
+    def get_many(self, keys: List[Tuple[str, str]]) -> List[Optional[List[str]]]:
+        """Stored tags for each (handle, hash) key, or None where it missed."""
+        stored = {
+            handle: (digest, tags) for handle, digest, tags in select_in(
+                self._conn, 'SELECT handle, content_hash, tags FROM product_tags WHERE handle IN ({})',
+                list({handle for handle, _ in keys}))
+        }
+
+        results = []
+        for handle, digest in keys:
+            entry = stored.get(handle)
+            if entry is not None and entry[0] == digest:
+                results.append(json.loads(entry[1]))
+                self.hits += 1
+            else:
+                results.append(None)
+                self.misses += 1
+        return results
+
+    def put_many(self, entries: Iterable[Tuple[Tuple[str, str], List[str]]]):
+        """Store tags for (handle, hash) keys, replacing older entries."""
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO product_tags (handle, content_hash, tags) VALUES (?, ?, ?)',
+            ((handle, digest, json.dumps(tags)) for (handle, digest), tags in entries),
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,84 @@
+"""
+Delta output: a minimal Shopify import with only the products whose tags changed.
+
+Each freshly tagged product is compared with its old tags, taken from the
+export's own Tags column or, when given, from a previous output file. Tag
+sets are compared, so reordering alone is not a change. Changed products
+are written as Handle,Tags rows, and added/removed tags are counted per
+dimension (the part of the tag before ':').
+"""
+
+import csv
+from typing import Dict, Iterable, List, Optional
+
+from tag_vocab import TagSet, TagVocabulary
+
+DELTA_FIELDNAMES = ['Handle', 'Tags']
+
+
+def parse_tags(tags: str) -> List[str]:
+    """Split a Shopify Tags cell into its tags."""
+    return [tag.strip() for tag in tags.split(',') if tag.strip()] if tags else []
+
+
+def load_previous_tags(path: str) -> Dict[str, str]:
+    """Handle -> Tags for every product row of an earlier output file."""
+    previous = {}
+    with open(path, 'r', encoding='utf-8', newline='') as handle:
+        for row in csv.DictReader(handle):
+            if row.get('Title', '') and row.get('Handle', ''):
+                previous[row['Handle']] = row.get('Tags', '')
+    return previous
+
+
+class TagDelta:
+    """Streams changed products to a Handle,Tags CSV and tallies the changes."""
+
+    def __init__(self, path: str, previous: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.previous = previous
+        self.compared = 0
+        self.changed = 0
+        self.added = {}
+        self.removed = {}
+        self.vocabulary = TagVocabulary()
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=DELTA_FIELDNAMES)
+        self._writer.writeheader()
+
+    def add(self, handle: str, old_tags: str, new_tags: Iterable[str]):
+        """Compare one product's new tags with its old ones; write it if they differ."""
+        if self.previous is not None and handle in self.previous:
+            old_tags = self.previous[handle]
+        new_tags = list(new_tags)
+        old = TagSet(self.vocabulary, parse_tags(old_tags))
+        new = TagSet(self.vocabulary, new_tags)
+        self.compared += 1
+        if old == new:
+            return
+
+        self.changed += 1
+        self._writer.writerow({'Handle': handle, 'Tags': ', '.join(new_tags)})
+        for counts, changes in ((self.added, new.dimension_counts(old)),
+                                (self.removed, old.dimension_counts(new))):
+            for dimension, count in changes.items():
+                counts[dimension] = counts.get(dimension, 0) + count
+
+    def summary(self) -> str:
+        lines = [f"Delta: {self.changed} of {self.compared} products changed, "
+                 f"written to: {self.path}"]
+        dimensions = sorted(set(self.added) | set(self.removed),
+                            key=lambda d: (-(self.added.get(d, 0) + self.removed.get(d, 0)), d))
+        for dimension in dimensions:
+            lines.append(f"  {dimension:<16} +{self.added.get(dimension, 0):<8} "
+                         f"-{self.removed.get(dimension, 0)}")
+        return '\n'.join(lines)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
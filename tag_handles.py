@@ -0,0 +1,62 @@
+"""
+On-disk handle index for exports whose rows are out of order.
+
+Shopify exports list a product's image and variant rows right after its
+main row, but merged or re-sorted exports scatter them. Tagging those needs
+to know, for any image row, whether its handle's product was tagged
+anywhere in the file. Holding every handle in a set does not scale to
+exports with millions of rows, so the handles go into a SQLite table
+instead: memory stays at SQLite's page cache however many there are.
+"""
+
+import sqlite3
+from typing import Iterable, Set
+
+from tag_cache import select_in
+
+# Handles inserted per executemany call while building the index
+_INSERT_CHUNK = 10000
+
+
+class HandleIndex:
+    """SQLite-backed set of handles.
+
+    With no path the table lives in a private temporary file that SQLite
+    deletes on close.
+    """
+
+    def __init__(self, path: str = ''):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        # Throwaway data: no journal, no fsync
+        self._conn.execute('PRAGMA journal_mode=OFF')
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS handles (handle TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def add_many(self, handles: Iterable[str]):
+        chunk = []
+        for handle in handles:
+            chunk.append((handle,))
+            if len(chunk) >= _INSERT_CHUNK:
+                self._insert(chunk)
+                chunk = []
+        if chunk:
+            self._insert(chunk)
+
+    def _insert(self, chunk):
+        with self._conn:
+            self._conn.executemany('INSERT OR IGNORE INTO handles (handle) VALUES (?)', chunk)
+
+    def contains_many(self, handles: Iterable[str]) -> Set[str]:
+        """The subset of handles that are in the index."""
+        return {handle for handle, in select_in(
+            self._conn, 'SELECT handle FROM handles WHERE handle IN ({})', list(set(handles)))}
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
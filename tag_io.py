@@ -0,0 +1,193 @@
+"""
+Parquet and Arrow IPC input/output for the tagger.
+
+A Shopify export can be converted once to a compact columnar file holding
+only the columns the tagger reads (Handle, Title, Body (HTML), Type,
+Vendor, Tags), and then re-tagged from it as often as needed without
+paying for CSV parsing and quoting of the large Body (HTML) fields.
+Converted with --all-columns it keeps every column, and tagging it writes
+the full export back out.
+Both are memory-mapped and read batch by batch.
+
+The format is picked from the file extension. pyarrow is only needed when
+one of these files is actually used.
+
+Usage:
+    python tag_io.py export.csv export.parquet [--all-columns]
+"""
+
+import argparse
+import csv
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Everything generate_tags_for_product and the row grouping look at
+TAGGER_COLUMNS = ['Handle', 'Title', 'Body (HTML)', 'Type', 'Vendor', 'Tags']
+
+COLUMNAR_FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'ipc',
+    '.feather': 'ipc',
+    '.ipc': 'ipc',
+}
+
+DEFAULT_ROWS_PER_BATCH = 10000
+
+
+def columnar_format(path: str) -> Optional[str]:
+    """'parquet' or 'ipc' for columnar file names, None for anything else."""
+    for suffix, file_format in COLUMNAR_FORMATS.items():
+        if path.lower().endswith(suffix):
+            return file_format
+    return None
+
+
+def _require_pyarrow() -> tuple:
+    """(pyarrow, pyarrow.parquet), imported on first use.
+
+    generate_tags imports this module on every run, and importing pyarrow
+    costs more than the rest of its start-up, so only runs that actually
+    touch a columnar file pay for it.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Arrow files need pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def _rows_from_batches(batches: Iterable, columns: List[str]) -> Iterator[Dict[str, str]]:
+    for batch in batches:
+        values = [batch.column(batch.schema.get_field_index(name)).to_pylist() for name in columns]
+        for row in zip(*values):
+            yield {
+                name: '' if value is None else value if isinstance(value, str) else str(value)
+                for name, value in zip(columns, row)
+            }
+
+
+def _present(columns: Optional[List[str]], names: List[str]) -> List[str]:
+    """The columns found in a file with the given column names, in the order asked for."""
+    if columns is None:
+        return list(names)
+    return [name for name in columns if name in names]
+
+
+@contextmanager
+def read_columnar(path: str, columns: Optional[List[str]] = TAGGER_COLUMNS,
+                  rows_per_batch: int = DEFAULT_ROWS_PER_BATCH):
+    """Yield (fieldnames, rows) for a Parquet or Arrow IPC file.
+
+    Only `columns` that exist in the file are read (every column if None),
+    and rows come out as dicts of str like csv.DictReader gives, with nulls
+    as ''.
+    """
+    pa, pq = _require_pyarrow()
+
+    with pa.memory_map(path, 'r') as source:
+        if columnar_format(path) == 'parquet':
+            parquet_file = pq.ParquetFile(source)
+            names = _present(columns, parquet_file.schema_arrow.names)
+            batches = parquet_file.iter_batches(batch_size=rows_per_batch, columns=names)
+        else:
+            reader = pa.ipc.open_file(source)
+            names = _present(columns, reader.schema.names)
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+        yield names, _rows_from_batches(batches, names)
+
+
+class ColumnarWriter:
+    """Write dict rows to Parquet or Arrow IPC, in batches, as string columns.
+
+    Has DictWriter's writeheader/writerow/writerows so it can stand in for one.
+    """
+
+    def __init__(self, path: str, fieldnames: List[str],
+                 rows_per_batch: int = DEFAULT_ROWS_PER_BATCH):
+        pa, pq = _require_pyarrow()
+        self._pa = pa
+        self.fieldnames = list(fieldnames)
+        self.rows_per_batch = rows_per_batch
+        self._schema = pa.schema([(name, pa.string()) for name in self.fieldnames])
+        self._pending = []
+        if columnar_format(path) == 'parquet':
+            self._writer = pq.ParquetWriter(path, self._schema)
+            self._sink = None
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+
+    def writeheader(self):
+        """The schema is the header; nothing to do."""
+
+    def writerow(self, row: Dict[str, str]):
+        self._pending.append(row)
+        if len(self._pending) >= self.rows_per_batch:
+            self._flush()
+
+    def writerows(self, rows: Iterable[Dict[str, str]]):
+        for row in rows:
+            self.writerow(row)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pa = self._pa
+        arrays = [pa.array([row.get(name, '') for row in self._pending], type=pa.string())
+                  for name in self.fieldnames]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+        if self._sink is None:
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        self._pending = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def convert_csv(csv_path: str, output_path: str, all_columns: bool = False) -> int:
+    """Copy a Shopify CSV export into a Parquet/Arrow file; returns the row count.
+
+    Only TAGGER_COLUMNS are kept unless all_columns is set.
+    """
+    rows = 0
+    with open(csv_path, 'r', encoding='utf-8', newline='') as infile:
+        reader = csv.DictReader(infile)
+        fieldnames = reader.fieldnames or []
+        if not all_columns:
+            fieldnames = [name for name in fieldnames if name in TAGGER_COLUMNS]
+        with ColumnarWriter(output_path, fieldnames) as writer:
+            for row in reader:
+                writer.writerow(row)
+                rows += 1
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Convert a Shopify CSV export to Parquet or Arrow IPC.")
+    parser.add_argument('input', help='Shopify product export CSV')
+    parser.add_argument('output', help='.parquet, .arrow or .feather file to write')
+    parser.add_argument('--all-columns', action='store_true',
+                        help='keep every column, not just the ones the tagger reads')
+    args = parser.parse_args(argv)
+
+    if columnar_format(args.output) is None:
+        parser.error('output must end in .parquet, .pq, .arrow, .feather or .ipc')
+    rows = convert_csv(args.input, args.output, args.all_columns)
+    print(f"Converted {rows} rows to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
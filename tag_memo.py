@@ -0,0 +1,93 @@
+"""
+Bounded LRU memo for the title-only extractors.
+
+Exports repeat titles a lot (colorway variants, re-listed SKUs), and the
+brand, length, capacity, bundle and title-only joint extractors give the
+same answer for the same title every time. The memo keeps those answers
+under an approximate memory budget, evicting the least recently used
+entries first, and counts hits, misses and evictions.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+# Rough per-entry cost of the OrderedDict slot and its links
+_ENTRY_OVERHEAD = 100
+
+
+def _approx_size(value) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(_approx_size(item) for item in value if item is not None)
+    return size
+
+
+class BoundedMemo:
+    """LRU memo capped at roughly max_bytes of keys and values (0 disables it)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        # The tagging service looks titles up from several threads at once
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Hashable, compute: Callable, *args):
+        """Return the memoized value for key, or compute(*args) and remember it."""
+        entries = self._entries
+        with self._lock:
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Computed outside the lock; if another thread stored the key in the
+        # meantime, its entry is kept and counted once
+        value = compute(*args)
+        if self.max_bytes > 0:
+            entry_size = _approx_size(key) + _approx_size(value) + _ENTRY_OVERHEAD
+            with self._lock:
+                if key not in entries:
+                    entries[key] = (value, entry_size)
+                    self.size += entry_size
+                    self._shrink()
+        return value
+
+    def _shrink(self):
+        entries = self._entries
+        while self.size > self.max_bytes and entries:
+            _, (_, entry_size) = entries.popitem(last=False)
+            self.size -= entry_size
+            self.evictions += 1
+
+    def resize(self, max_bytes: int):
+        """Change the memory budget, evicting entries if it shrank."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            if max_bytes <= 0:
+                self._entries.clear()
+                self.size = 0
+            else:
+                self._shrink()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'title_memo_hits': self.hits,
+            'title_memo_misses': self.misses,
+            'title_memo_evictions': self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,113 @@
+"""
+Per-extractor timing and rule-hit counters for the tag generator.
+
+A TagProfile wraps functions so every call is counted and timed into a
+latency histogram, and counts which family rule settled each product. Its
+data is a plain dict of counts, so profiles from worker processes can be
+pickled back and added together with merge_counts.
+"""
+
+import copy
+import time
+from typing import Callable, Dict, List
+
+# Upper bounds of the latency histogram buckets, in microseconds; the last
+# bucket catches everything slower
+HISTOGRAM_BOUNDS_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def histogram_labels() -> List[str]:
+    labels = [f'<={bound}us' for bound in HISTOGRAM_BOUNDS_US]
+    labels.append(f'>{HISTOGRAM_BOUNDS_US[-1]}us')
+    return labels
+
+
+def merge_counts(into: Dict, other: Dict) -> Dict:
+    """Add the numbers in `other` into `into`, recursing into dicts and lists."""
+    for key, value in other.items():
+        if key not in into:
+            into[key] = copy.deepcopy(value)
+        elif isinstance(value, dict):
+            merge_counts(into[key], value)
+        elif isinstance(value, list):
+            into[key] = [a + b for a, b in zip(into[key], value)]
+        else:
+            into[key] += value
+    return into
+
+
+class TagProfile:
+    """Call counts, cumulative time and histograms per function, plus rule hits."""
+
+    def __init__(self):
+        self.data = {'functions': {}, 'rules': {}}
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """Wrap func so each call is recorded under `name`."""
+        entry = self.data['functions'].setdefault(name, {
+            'calls': 0,
+            'seconds': 0.0,
+            'histogram': [0] * (len(HISTOGRAM_BOUNDS_US) + 1),
+        })
+        histogram = entry['histogram']
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                entry['calls'] += 1
+                entry['seconds'] += elapsed
+                elapsed_us = elapsed * 1e6
+                for bucket, bound in enumerate(HISTOGRAM_BOUNDS_US):
+                    if elapsed_us <= bound:
+                        histogram[bucket] += 1
+                        break
+                else:
+                    histogram[-1] += 1
+
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def count_rule(self, branch: str):
+        rules = self.data['rules']
+        rules[branch] = rules.get(branch, 0) + 1
+
+    def merge(self, data: Dict):
+        merge_counts(self.data, data)
+
+    def to_dict(self) -> Dict:
+        """JSON-ready copy of the data, with named histogram buckets."""
+        labels = histogram_labels()
+        return {
+            'functions': {
+                name: {
+                    'calls': entry['calls'],
+                    'seconds': round(entry['seconds'], 6),
+                    'mean_us': round(entry['seconds'] / entry['calls'] * 1e6, 3) if entry['calls'] else None,
+                    'histogram': dict(zip(labels, entry['histogram'])),
+                }
+                for name, entry in self.data['functions'].items()
+            },
+            'rules': dict(sorted(self.data['rules'].items(), key=lambda item: -item[1])),
+        }
+
+    def summary(self) -> str:
+        """Human-readable report: slowest functions first, then rule hits."""
+        functions = sorted(self.data['functions'].items(), key=lambda item: -item[1]['seconds'])
+        lines = [f"{'function':<30} {'calls':>9} {'total s':>9} {'mean us':>9}  latency histogram"]
+        labels = histogram_labels()
+        for name, entry in functions:
+            calls = entry['calls']
+            mean_us = entry['seconds'] / calls * 1e6 if calls else 0.0
+            buckets = ' '.join(f'{label}:{count}' for label, count in zip(labels, entry['histogram']) if count)
+            lines.append(f"{name:<30} {calls:>9} {entry['seconds']:>9.3f} {mean_us:>9.2f}  {buckets}")
+
+        rules = sorted(self.data['rules'].items(), key=lambda item: -item[1])
+        if rules:
+            lines.append('')
+            lines.append(f"{'family rule':<44} {'hits':>9}")
+            lines.extend(f"{branch:<44} {hits:>9}" for branch, hits in rules)
+        return '\n'.join(lines)
@@ -0,0 +1,518 @@
+"""
+Rule tables for the tagger and the matchers compiled from them.
+
+The brand aliases, product type mapping, family profiles and ordered family
+rules live in a JSON rules file (rules.json next to this module by
+default), so they can be changed without touching code:
+
+    known_brands     alias -> brand tag; the longest alias in a title wins
+    type_mapping     lowercased Type -> tag profile; a null pillar or family
+                     means "determine from content"
+    family_profiles  profile name -> the tags a family rule assigns
+    family_rules     ordered content rules; the first rule whose "when"
+                     conditions all hold wins, and within it the first
+                     matching variant picks the profile, otherwise the
+                     rule's own profile is used. A condition is
+                     [source, keywords] and holds when any keyword is a
+                     substring of the source: "title", "body", or "body:N"
+                     for the first N characters of the body. "note" is a
+                     free-text comment.
+
+Compiling the matchers takes several milliseconds, so the compiled ruleset
+is pickled to a snapshot beside the rules file and loaded from there. The
+snapshot is keyed by a hash of the rules file and of this module, and is
+rebuilt automatically whenever either changes. Only load snapshots you
+wrote yourself; they are pickles.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+RULE_TABLES = ('known_brands', 'type_mapping', 'family_profiles', 'family_rules')
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Build a regex alternation that shares common prefixes through a trie.
+
+    Every word that is a prefix of a longer one becomes a greedy optional
+    group, so at any position the regex engine settles on the longest word
+    that matches there.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node: Dict) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return emit(trie)
+
+
+class BrandIndex:
+    """Brand alias lookup compiled once into a single trie-shaped regex.
+
+    Matches the old behaviour of trying aliases longest first: the longest
+    alias found anywhere in the text wins, and aliases of equal length are
+    decided by their order in the source mapping.
+    """
+
+    def __init__(self, aliases: Dict[str, str]):
+        ordered = sorted(aliases, key=len, reverse=True)
+        self._tags = dict(aliases)
+        self._rank = {alias: rank for rank, alias in enumerate(ordered)}
+        # The lookahead lets matches overlap, so a short alias can never hide
+        # a longer one that starts inside it.
+        self._pattern = re.compile('(?=(' + _trie_pattern(ordered) + '))') if ordered else None
+
+    def find(self, text: str) -> Optional[str]:
+        """Return the tag for the best alias found in text, if any."""
+        if self._pattern is None:
+            return None
+
+        best = None
+        best_rank = len(self._rank)
+        for match in self._pattern.finditer(text):
+            alias = match.group(1)
+            rank = self._rank[alias]
+            if rank < best_rank:
+                best, best_rank = alias, rank
+                if rank == 0:
+                    break
+
+        return self._tags[best] if best is not None else None
+
+
+# Window prefixes whose candidate aliases FuzzyBrandIndex remembers
+_CANDIDATE_MEMO_SIZE = 65536
+
+
+class BrandMatch(NamedTuple):
+    tag: str
+    # 1.0 for an exact match, lower the more edits it took
+    confidence: float
+    # The words of the text that matched
+    text: str
+
+
+def _deletes(word: str, distance: int) -> Set[str]:
+    """word and every string made by deleting up to distance characters from it."""
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting a swap of adjacent characters as one edit; limit + 1 once over limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, row = previous, row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class FuzzyBrandIndex:
+    """Brand lookup that tolerates typos and spacing, through a deletion index.
+
+    Every alias, and every brand tag's own slug, is compacted to its letters
+    and digits ("zig-zag" and "zig zag" both become "zigzag"), and every
+    string left by deleting up to max_distance characters from the first
+    prefix_length characters of a compacted alias is indexed. A title is
+    split into words, and each run of up to max_words consecutive words is
+    compacted the same way; the deletes of its prefix are looked up in the
+    index, and only the aliases found there have their edit distance
+    computed. So the work per title depends on the title's length, not on
+    the number of brands, and indexing prefixes keeps the deletes per window
+    few however long the window is.
+
+    Short aliases are easy to hit by accident, so how many edits an alias
+    allows grows with its length: none below min_length characters, one
+    up to 8, and max_distance from 9.
+    """
+
+    def __init__(self, aliases: Dict[str, str], max_distance: int = 2, min_length: int = 5,
+                 max_words: int = 3, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.max_words = max_words
+        self.prefix_length = prefix_length
+        self._tags = {}
+        for alias, tag in aliases.items():
+            for name in (alias, tag.partition(':')[2]):
+                self._tags.setdefault(self._compact(name), tag)
+        self._tags.pop('', None)
+        self._index = {}
+        for key in self._tags:
+            for variant in _deletes(key[:prefix_length], self._allowed(len(key))):
+                self._index.setdefault(variant, []).append(key)
+        lengths = [len(key) for key in self._tags] or [0]
+        self._shortest = min(lengths) - max_distance
+        self._longest = max(lengths) + max_distance
+        # (prefix, edits) -> candidate aliases; titles share most words, so
+        # this spares nearly all the delete lookups
+        self._candidates = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_candidates'] = {}
+        return state
+
+    @staticmethod
+    def _compact(text: str) -> str:
+        return ''.join(re.findall('[a-z0-9]+', text.lower()))
+
+    def _allowed(self, length: int) -> int:
+        """Edits an alias of this length tolerates."""
+        if length < self.min_length:
+            return 0
+        return 1 if length <= 8 else self.max_distance
+
+    def _windows(self, text: str) -> Iterator[tuple]:
+        """(compacted, original) for each run of up to max_words consecutive words."""
+        words = re.findall('[a-z0-9]+', text.lower())
+        for start in range(len(words)):
+            compacted = ''
+            for end in range(start, min(start + self.max_words, len(words))):
+                compacted += words[end]
+                if len(compacted) > self._longest:
+                    break
+                if len(compacted) >= self._shortest:
+                    yield compacted, ' '.join(words[start:end + 1])
+
+    def _candidate_keys(self, prefix: str, edits: int) -> tuple:
+        """Aliases sharing a delete with prefix, in sorted order."""
+        candidates = self._candidates.get((prefix, edits))
+        if candidates is None:
+            found = set()
+            for variant in _deletes(prefix, edits):
+                found.update(self._index.get(variant, ()))
+            candidates = tuple(sorted(found))
+            if len(self._candidates) >= _CANDIDATE_MEMO_SIZE:
+                self._candidates.clear()
+            self._candidates[(prefix, edits)] = candidates
+        return candidates
+
+    def find(self, text: str) -> Optional[BrandMatch]:
+        """The most confident brand match in text, if any."""
+        best = None
+        for compacted, original in self._windows(text):
+            if compacted in self._tags:
+                match = BrandMatch(self._tags[compacted], 1.0, original)
+            else:
+                match = None
+                # A window may match an alias a few characters longer than
+                # itself, which allows that alias's number of edits
+                candidates = self._candidate_keys(compacted[:self.prefix_length],
+                                                  self._allowed(len(compacted) + self.max_distance))
+                for key in candidates:
+                    allowed = self._allowed(len(key))
+                    distance = _edit_distance(compacted, key, allowed)
+                    if distance <= allowed:
+                        confidence = 1.0 - distance / max(len(key), len(compacted))
+                        if match is None or confidence > match.confidence:
+                            match = BrandMatch(self._tags[key], confidence, original)
+            if match is not None and (best is None or match.confidence > best.confidence):
+                best = match
+                if best.confidence == 1.0:
+                    break
+        return best
+
+
+class KeywordMatcher:
+    """Finds every keyword that occurs as a substring, in a single scan.
+
+    The regex picks the longest keyword at each match and shorter keywords
+    contained in it come from a precomputed table, so the result equals
+    running `keyword in text` for every keyword. The one thing a single
+    non-overlapping scan can miss is a keyword that starts inside a match
+    and runs past its end; the character after each match tells us when
+    that is possible, and only then do we rescan one position at a time.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        keywords = set(keywords)
+        ordered = sorted(keywords, key=len, reverse=True)
+        trie = _trie_pattern(ordered)
+        self._pattern = re.compile('(' + trie + ')(?=(.?))', re.DOTALL) if ordered else None
+        self._search = re.compile(trie).search if ordered else None
+        self._contained = {
+            keyword: frozenset(other for other in keywords if other in keyword)
+            for keyword in keywords
+        }
+
+        # Characters that, right after a match, could continue a keyword
+        # that started inside that match
+        self._follow = {}
+        for keyword in keywords:
+            follow = set()
+            for offset in range(1, len(keyword)):
+                tail = keyword[offset:]
+                follow.update(other[len(tail)] for other in keywords
+                              if len(other) > len(tail) and other.startswith(tail))
+            if follow:
+                self._follow[keyword] = frozenset(follow)
+
+    def hits(self, text: str) -> Set[str]:
+        """Return the set of keywords found in text."""
+        found = set()
+        if self._pattern is None:
+            return found
+
+        contained = self._contained
+        follow = self._follow
+        for keyword, after in self._pattern.findall(text):
+            found |= contained[keyword]
+            if after and after in follow.get(keyword, ()):
+                return self._overlapping_hits(text)
+        return found
+
+    def _overlapping_hits(self, text: str) -> Set[str]:
+        """Slow path: resume one character after each match start."""
+        found = set()
+        match = self._search(text)
+        while match is not None:
+            found |= self._contained[match.group()]
+            match = self._search(text, match.start() + 1)
+        return found
+
+
+def _compile_conditions(conditions: List) -> tuple:
+    """Turn (source, keywords) pairs into (window, keywords) pairs.
+
+    Title conditions get a window of None and a frozenset for set lookups;
+    body conditions keep a tuple and the character window (0 = whole body).
+    """
+    compiled = []
+    for source, keywords in conditions:
+        if source == 'title':
+            compiled.append((None, frozenset(keywords)))
+        else:
+            _, _, window = source.partition(':')
+            compiled.append((int(window or 0), tuple(keywords)))
+    return tuple(compiled)
+
+
+class FamilyClassifier:
+    """Ordered family rules compiled into one title scan plus priority lookups.
+
+    Every rule is indexed by the keywords of its first title condition, so a
+    single keyword scan of the title tells us which rules can fire; those
+    are then checked in table order and the first one that holds wins.
+    """
+
+    def __init__(self, rules: List[Dict], profiles: Dict[str, Dict]):
+        self._rules = []
+        self._rules_by_keyword = {}
+        self._always = []
+        title_keywords = set()
+
+        for index, rule in enumerate(rules):
+            when = _compile_conditions(rule['when'])
+            # Variants are named after the rule and their profile for match()
+            variants = tuple(
+                (_compile_conditions(conditions), f"{rule['name']}:{profile}", profiles[profile])
+                for conditions, profile in rule.get('variants', [])
+            )
+
+            for conditions in (when,) + tuple(conditions for conditions, _, _ in variants):
+                for window, keywords in conditions:
+                    if window is None:
+                        title_keywords.update(keywords)
+
+            # A rule is only a candidate once its trigger condition has hit,
+            # so the remaining conditions are all that is left to check.
+            trigger = next((c for c in when if c[0] is None), None)
+            if trigger is None:
+                self._always.append(index)
+                rest = when
+            else:
+                for keyword in trigger[1]:
+                    self._rules_by_keyword.setdefault(keyword, []).append(index)
+                rest = tuple(c for c in when if c is not trigger)
+
+            self._rules.append((rule['name'], rest, variants, profiles[rule['profile']]))
+
+        # Every keyword a title condition looks for
+        self.title_keywords = frozenset(title_keywords)
+        self._matcher = KeywordMatcher(title_keywords)
+        # Fast path: most titles are settled by the first rule they trigger
+        self._first_rule = {keyword: indices[0] for keyword, indices in self._rules_by_keyword.items()}
+        self._trigger_keywords = frozenset(self._first_rule)
+        self._first_always = self._always[0] if self._always else len(self._rules)
+
+    @staticmethod
+    def _holds(conditions: tuple, title_hits: Set[str], text: 'ProductText') -> bool:
+        for window, keywords in conditions:
+            if window is None:
+                if title_hits.isdisjoint(keywords):
+                    return False
+            else:
+                if not text.body_may_contain(*keywords):
+                    return False
+                body_lower = text.body_prefix_lower(window) if window else text.body_lower
+                if not any(keyword in body_lower for keyword in keywords):
+                    return False
+        return True
+
+    def classify(self, text: 'ProductText', title_hits: Optional[Set[str]] = None) -> Optional[Dict]:
+        """Return a copy of the first matching profile, or None."""
+        matched = self.match(text, title_hits)
+        return matched[1].copy() if matched else None
+
+    def match(self, text: 'ProductText', title_hits: Optional[Set[str]] = None) -> Optional[tuple]:
+        """Return (branch, profile) for the first matching rule, or None.
+
+        The branch is the rule name, or "rule:profile" when one of the
+        rule's variants picked the profile. The profile is shared; copy it
+        before changing it. title_hits, when given, must hold every one of
+        title_keywords that is in the title (other words are ignored), and
+        spares the title scan.
+        """
+        if title_hits is None:
+            title_hits = self._matcher.hits(text.title_lower)
+        triggered = title_hits & self._trigger_keywords
+
+        if not triggered:
+            candidates = self._always
+        else:
+            first = min(map(self._first_rule.__getitem__, triggered))
+            if first < self._first_always and not self._rules[first][1]:
+                # Nothing else to check: the earliest triggered rule wins
+                candidates = (first,)
+            else:
+                candidates = set(self._always)
+                for keyword in triggered:
+                    candidates.update(self._rules_by_keyword[keyword])
+                candidates = sorted(candidates)
+
+        for index in candidates:
+            name, rest, variants, profile = self._rules[index]
+            if rest and not self._holds(rest, title_hits, text):
+                continue
+            for conditions, variant_name, variant_profile in variants:
+                if self._holds(conditions, title_hits, text):
+                    return variant_name, variant_profile
+            return name, profile
+
+        return None
+
+
+class Ruleset:
+    """The rule tables from one rules file and the matchers compiled from them."""
+
+    def __init__(self, tables: Dict, version: str):
+        missing = [name for name in RULE_TABLES if name not in tables]
+        if missing:
+            raise ValueError(f"rules file is missing: {', '.join(missing)}")
+        unknown = sorted({rule['profile'] for rule in tables['family_rules']}
+                         .union(profile for rule in tables['family_rules']
+                                for _, profile in rule.get('variants', []))
+                         .difference(tables['family_profiles']))
+        if unknown:
+            raise ValueError(f"family rules use unknown profiles: {', '.join(unknown)}")
+
+        self.version = version
+        self.known_brands = tables['known_brands']
+        self.type_mapping = tables['type_mapping']
+        self.family_profiles = tables['family_profiles']
+        self.family_rules = tables['family_rules']
+        self.brand_index = BrandIndex(self.known_brands)
+        self.fuzzy_brand_index = FuzzyBrandIndex(self.known_brands)
+        self.family_classifier = FamilyClassifier(self.family_rules, self.family_profiles)
+
+
+def rules_version(source: bytes) -> str:
+    """Hash of a rules file's contents and of the code that compiles it."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(source)
+    with open(__file__, 'rb') as code:
+        digest.update(code.read())
+    return digest.hexdigest()
+
+
+def snapshot_path(rules_file: str) -> str:
+    return rules_file + '.snapshot'
+
+
+def _read_snapshot(path: str, version: str) -> Optional[Ruleset]:
+    """The pickled ruleset at path if it was built from `version`, else None."""
+    try:
+        with open(path, 'rb') as snapshot:
+            # The version is pickled first, so a stale snapshot is rejected
+            # without unpickling the rest
+            if pickle.load(snapshot) != version:
+                return None
+            ruleset = pickle.load(snapshot)
+    except Exception:
+        # Missing, truncated, corrupt, or written by incompatible code: rebuild it
+        return None
+    return ruleset if isinstance(ruleset, Ruleset) and ruleset.version == version else None
+
+
+def _write_snapshot(path: str, ruleset: Ruleset):
+    """Write the snapshot atomically; readers see the old file or the new one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.')
+    except OSError:
+        # Read-only install: go on without a snapshot
+        return
+    try:
+        with os.fdopen(fd, 'wb') as snapshot:
+            pickle.dump(ruleset.version, snapshot, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(ruleset, snapshot, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except BaseException as exc:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        # A failed write (disk full, say) only costs the snapshot
+        if not isinstance(exc, OSError):
+            raise
+
+
+def load_rules(path: str = DEFAULT_RULES_FILE, use_snapshot: bool = True) -> Ruleset:
+    """Load a rules file, from its compiled snapshot when that is up to date."""
+    with open(path, 'rb') as rules_file:
+        source = rules_file.read()
+    version = rules_version(source)
+
+    if use_snapshot:
+        ruleset = _read_snapshot(snapshot_path(path), version)
+        if ruleset is not None:
+            return ruleset
+
+    try:
+        tables = json.loads(source)
+    except ValueError as exc:
+        raise ValueError(f"{path}: invalid JSON: {exc}") from exc
+    ruleset = Ruleset(tables, version)
+    if use_snapshot:
+        _write_snapshot(snapshot_path(path), ruleset)
+    return ruleset
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Long-running local tagging service.
+
+Keeps the tagger loaded (brand index, family classifier, compiled
+patterns, title memo) in one process and serves it over HTTP/JSON, so
+ingest jobs pay a request round trip instead of a Python start-up and
+import for every product.
+
+Endpoints:
+    GET  /health   {"status": "ok", "ruleset_version": ...}
+    POST /tag      one product object       -> {"handle": ..., "tags": [...]}
+                   {"products": [objects]}   -> {"results": [{"handle": ..., "tags": [...]}, ...]}
+
+Product objects use either snake_case keys (handle, title, body_html,
+product_type, vendor) or the Shopify CSV column names (Handle, Title,
+Body (HTML), Type, Vendor). "tags" is null for out-of-scope vendors.
+
+Usage:
+    python tag_service.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from generate_tags import RULESET_VERSION, generate_tags_for_columns, generate_tags_for_product
+
+# Largest request body accepted, in bytes
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# JSON key -> Shopify CSV column name for each product field
+FIELD_ALIASES = {
+    'handle': 'Handle',
+    'title': 'Title',
+    'body_html': 'Body (HTML)',
+    'product_type': 'Type',
+    'vendor': 'Vendor',
+}
+
+
+class RequestError(Exception):
+    """A client error, answered with its status code and message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _field(product: Dict, name: str) -> str:
+    value = product.get(name, product.get(FIELD_ALIASES[name]))
+    return '' if value is None else str(value)
+
+
+def tag_products(products: List[Dict]) -> List[Dict]:
+    """Tag a batch of product objects in one columnar pass."""
+    if not all(isinstance(product, dict) for product in products):
+        raise RequestError(400, 'every product must be a JSON object')
+    columns = [[_field(product, name) for product in products]
+               for name in ('title', 'body_html', 'product_type', 'vendor')]
+    results = generate_tags_for_columns(*columns)
+    return [{'handle': _field(product, 'handle'), 'tags': tags}
+            for product, tags in zip(products, results)]
+
+
+def tag_request(payload) -> Dict:
+    """Answer a /tag request body: one product, or {"products": [...]}."""
+    if not isinstance(payload, dict):
+        raise RequestError(400, 'request body must be a JSON object')
+    if 'products' in payload:
+        if not isinstance(payload['products'], list):
+            raise RequestError(400, '"products" must be a list')
+        return {'results': tag_products(payload['products'])}
+    tags = generate_tags_for_product(
+        _field(payload, 'handle'), _field(payload, 'title'), _field(payload, 'body_html'),
+        _field(payload, 'product_type'), _field(payload, 'vendor'), '')
+    return {'handle': _field(payload, 'handle'), 'tags': tags}
+
+
+class TagRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a client can stream requests over one connection, and
+    # no Nagle delay between the header and body writes of a response
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server_version = 'TagService/1.0'
+    quiet = True
+
+    def _send_json(self, status: int, body: Dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/health':
+            self._send_json(200, {'status': 'ok', 'ruleset_version': RULESET_VERSION})
+        else:
+            self._send_json(404, {'error': f'no such endpoint: {self.path}'})
+
+    def _content_length(self) -> int:
+        header = self.headers.get('Content-Length')
+        if header is None:
+            raise RequestError(411, 'Content-Length is required')
+        try:
+            length = int(header)
+        except ValueError:
+            raise RequestError(400, f'invalid Content-Length: {header!r}')
+        if length < 0:
+            raise RequestError(400, f'invalid Content-Length: {header!r}')
+        return length
+
+    def do_POST(self):
+        body_read = False
+        try:
+            if self.path.rstrip('/') != '/tag':
+                raise RequestError(404, f'no such endpoint: {self.path}')
+            length = self._content_length()
+            if length > MAX_REQUEST_BYTES:
+                raise RequestError(413, f'request body over {MAX_REQUEST_BYTES} bytes')
+            try:
+                body = self.rfile.read(length)
+                body_read = True
+                payload = json.loads(body)
+            except ValueError as exc:
+                raise RequestError(400, f'invalid JSON: {exc}')
+            self._send_json(200, tag_request(payload))
+        except RequestError as exc:
+            if not body_read:
+                # The unread body would be taken for the next request
+                self.close_connection = True
+            self._send_json(exc.status, {'error': str(exc)})
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8765, quiet: bool = True) -> ThreadingHTTPServer:
+    handler = type('Handler', (TagRequestHandler,), {'quiet': quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    # Run one product through so nothing is left to warm up on the first request
+    tag_request({'title': 'Warm Up 14mm Glass Rig', 'body_html': '<p>warm up</p>',
+                 'vendor': 'What You Need'})
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve generate_tags_for_product over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, quiet=not args.verbose)
+    print(f"Tagging service on http://{args.host}:{server.server_port} (ruleset {RULESET_VERSION[:12]})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
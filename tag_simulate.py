@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+What-if simulation of rule changes against a catalog snapshot.
+
+Tuning the family rules or the Type mapping by re-running the whole export
+spends most of its time reading the CSV and cleaning body HTML, neither of
+which a rules change affects. A catalog snapshot does that work once: it
+holds every in-scope product's handle, stripped title and Type, cleaned
+lowercased body, and the tags the current rules gave it, in one flat file
+that is memory-mapped for reading. A simulation re-tags every product from
+the snapshot under a candidate rules file and reports only the products
+whose pillar, family, use or material tags change.
+
+Snapshot layout (native byte order; snapshots are local cache files):
+
+    MAGIC                      8 bytes
+    count, version length     two unsigned 64-bit ints
+    ruleset version            ASCII, padded to a multiple of 8 bytes
+    offsets                    count * len(FIELDS) + 1 unsigned 64-bit ints
+    data                       UTF-8 field values, back to back
+
+Field j of product i is data[offsets[i * len(FIELDS) + j]:offsets[i * len(FIELDS) + j + 1]].
+
+Usage:
+    python tag_simulate.py snapshot export.csv catalog.snap
+    python tag_simulate.py run catalog.snap candidate_rules.json [--output changes.csv]
+"""
+
+import argparse
+import csv
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import generate_tags
+from generate_tags import (RULES, RULESET_VERSION, ProductText, _is_product_row, _open_rows, _RawRow,
+                           generate_tags_for_product, is_in_scope_vendor, strip_html)
+from tag_delta import parse_tags
+from tag_io import TAGGER_COLUMNS
+from tag_rules import Ruleset, load_rules
+
+MAGIC = b'WYNSIM1\n'
+
+FIELDS = ('handle', 'title', 'product_type', 'body', 'tags')
+
+# The dimensions a rules change is reported on
+SIMULATED_DIMENSIONS = ('pillar', 'family', 'use', 'material')
+
+CHANGE_FIELDNAMES = ['Handle', 'Title', 'Dimension', 'Before', 'After']
+
+_HEADER = struct.Struct('=8sQQ')
+
+# Brand, length, capacity and bundle come from the title alone and decide
+# none of the simulated dimensions, so simulation skips extracting them
+_NO_TITLE_TAGS = (None, None, None, None)
+
+
+def _padded(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % 8)
+
+
+def write_snapshot(input_file: str, path: str) -> int:
+    """Write the catalog snapshot of an export; returns the number of products."""
+    offsets = array('Q', [0])
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.')
+    try:
+        with ExitStack() as files:
+            snapshot = files.enter_context(os.fdopen(fd, 'wb'))
+            data = files.enter_context(tempfile.TemporaryFile(dir=directory))
+            _, rows = _open_rows(input_file, files, TAGGER_COLUMNS)
+            size = 0
+            for row in rows:
+                if isinstance(row, _RawRow) or not _is_product_row(row):
+                    continue
+                handle, title, body_html, product_type, vendor, existing = generate_tags._product_args(row)
+                if not is_in_scope_vendor(vendor):
+                    continue
+                tags = generate_tags_for_product(handle, title, body_html, product_type, vendor, existing)
+                values = (handle, (title or '').strip(), (product_type or '').strip(),
+                          strip_html(body_html or '').lower(), ', '.join(tags))
+                for value in values:
+                    encoded = value.encode('utf-8')
+                    data.write(encoded)
+                    size += len(encoded)
+                    offsets.append(size)
+
+            count = (len(offsets) - 1) // len(FIELDS)
+            version = RULESET_VERSION.encode('ascii')
+            snapshot.write(_HEADER.pack(MAGIC, count, len(version)))
+            snapshot.write(_padded(version))
+            snapshot.write(offsets.tobytes())
+            data.seek(0)
+            shutil.copyfileobj(data, snapshot)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
+
+
+class CatalogSnapshot:
+    """Read access to a catalog snapshot through a memory map."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as snapshot:
+            self._map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.count, version_size = _HEADER.unpack_from(self._map)
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a catalog snapshot")
+            start = _HEADER.size
+            self.ruleset_version = self._map[start:start + version_size].decode('ascii')
+            start += len(_padded(b'\0' * version_size))
+            end = start + 8 * (self.count * len(FIELDS) + 1)
+            self._offsets = memoryview(self._map)[start:end].cast('Q')
+            self._data_start = end
+            if self._data_start + self._offsets[-1] > len(self._map):
+                raise ValueError(f"{path}: catalog snapshot is truncated")
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> Tuple[str, ...]:
+        """(handle, title, product_type, body, tags) of the index-th product."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        offsets = self._offsets
+        base = self._data_start
+        first = index * len(FIELDS)
+        return tuple(self._map[base + offsets[field]:base + offsets[field + 1]].decode('utf-8')
+                     for field in range(first, first + len(FIELDS)))
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        if getattr(self, '_offsets', None) is not None:
+            self._offsets.release()
+            self._offsets = None
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def _using_rules(ruleset: Ruleset) -> Iterator[Ruleset]:
+    """Make the tagger classify families with ruleset's rules while the block runs."""
+    original = generate_tags.FAMILY_CLASSIFIER
+    generate_tags.FAMILY_CLASSIFIER = ruleset.family_classifier
+    try:
+        yield ruleset
+    finally:
+        generate_tags.FAMILY_CLASSIFIER = original
+
+
+def _dimension_tags(tags: List[str]) -> Dict[str, Tuple[str, ...]]:
+    """The simulated dimensions' tags, each dimension's sorted."""
+    found = {dimension: [] for dimension in SIMULATED_DIMENSIONS}
+    for tag in tags:
+        values = found.get(tag.partition(':')[0])
+        if values is not None:
+            values.append(tag)
+    return {dimension: tuple(sorted(values)) for dimension, values in found.items()}
+
+
+def _simulated_tags(ruleset: Ruleset, title: str, product_type: str, body: str) -> List[str]:
+    """A snapshot product's tags under ruleset (which must be in effect), title-only tags left out."""
+    type_info = ruleset.type_mapping.get(product_type.lower(), None)
+    return generate_tags._product_tags(ProductText.from_body(title, body), product_type, type_info,
+                                       _NO_TITLE_TAGS)
+
+
+def simulate(snapshot: CatalogSnapshot, candidate: Ruleset,
+             baseline: Optional[Ruleset] = None) -> Iterator[Tuple[str, str, str, tuple, tuple]]:
+    """(handle, title, dimension, before, after) for every simulated dimension that changes.
+
+    before is what baseline (the current rules by default) gives. The tags
+    stored in the snapshot are used for it when they were made by the same
+    rules and code; otherwise every product is tagged under both rulesets.
+    """
+    baseline = baseline or RULES
+    stored = baseline is RULES and snapshot.ruleset_version == RULESET_VERSION
+    for handle, title, product_type, body, tags in snapshot:
+        if stored:
+            before = _dimension_tags(parse_tags(tags))
+        else:
+            with _using_rules(baseline):
+                before = _dimension_tags(_simulated_tags(baseline, title, product_type, body))
+        with _using_rules(candidate):
+            after = _dimension_tags(_simulated_tags(candidate, title, product_type, body))
+        if before != after:
+            for dimension in SIMULATED_DIMENSIONS:
+                if before[dimension] != after[dimension]:
+                    yield handle, title, dimension, before[dimension], after[dimension]
+
+
+def run_simulation(snapshot_file: str, rules_file: str, output_file: Optional[str] = None,
+                   top: int = 10) -> int:
+    """Simulate rules_file against a snapshot and print what changes; returns the products changed."""
+    candidate = load_rules(rules_file, use_snapshot=False)
+    changed = set()
+    counts = {dimension: 0 for dimension in SIMULATED_DIMENSIONS}
+    transitions = {}
+
+    with ExitStack() as files:
+        snapshot = files.enter_context(CatalogSnapshot(snapshot_file))
+        writer = None
+        if output_file:
+            outfile = files.enter_context(open(output_file, 'w', encoding='utf-8', newline=''))
+            writer = csv.DictWriter(outfile, fieldnames=CHANGE_FIELDNAMES)
+            writer.writeheader()
+        if snapshot.ruleset_version != RULESET_VERSION:
+            print("Snapshot was tagged under other rules or code; re-tagging it under the current rules too")
+
+        for handle, title, dimension, before, after in simulate(snapshot, candidate):
+            changed.add(handle)
+            counts[dimension] += 1
+            transition = (', '.join(before) or '(none)', ', '.join(after) or '(none)')
+            transitions[transition] = transitions.get(transition, 0) + 1
+            if writer is not None:
+                writer.writerow({'Handle': handle, 'Title': title, 'Dimension': dimension,
+                                 'Before': transition[0], 'After': transition[1]})
+        total = len(snapshot)
+
+    print(f"Simulated {rules_file}: {len(changed)} of {total} products change")
+    for dimension in SIMULATED_DIMENSIONS:
+        print(f"  {dimension:<10} {counts[dimension]}")
+    if transitions:
+        print("Most common changes:")
+        for (before, after), count in sorted(transitions.items(), key=lambda item: -item[1])[:top]:
+            print(f"  {count:>7}  {before} -> {after}")
+    if output_file:
+        print(f"Changes written to: {output_file}")
+    return len(changed)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Preview the effect of a rules change on the catalog.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('snapshot', help='build a catalog snapshot from an export')
+    build.add_argument('input', help='Shopify product export CSV, or a .parquet/.arrow copy of it')
+    build.add_argument('snapshot', help='where to write the snapshot')
+    run = commands.add_parser('run', help='re-tag a snapshot under a candidate rules file')
+    run.add_argument('snapshot', help='catalog snapshot written by the snapshot command')
+    run.add_argument('rules', help='candidate rules file')
+    run.add_argument('--output', metavar='PATH',
+                     help='also write every change as a Handle,Title,Dimension,Before,After CSV')
+    run.add_argument('--top', type=int, default=10, help='most common changes to list (default: 10)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'snapshot':
+        count = write_snapshot(args.input, args.snapshot)
+        print(f"Snapshot of {count} products written to: {args.snapshot}")
+    else:
+        run_simulation(args.snapshot, args.rules, args.output, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Spec validation of generated tags.
+
+Checks each product's tags against the tagging spec: every tag must be
+'dimension:value' for one of the spec's thirteen dimensions, with a value
+the dimension allows, no legacy tag (c:, f:, b:, sc:, bare made-in-usa)
+may appear, and pillar, family and format must occur exactly once and
+brand at most once.
+
+The allowed values are compiled once into a schema: closed dimensions get
+a set of values, seeded from the spec and from every tag in the rule
+tables; open ones (brand, length, capacity, style, bundle) get a pattern.
+Each distinct tag string is judged once and the verdict cached, so a
+product costs a dict lookup per tag plus the cardinality count, cheap
+enough to run alongside tagging.
+
+Usage:
+    python tag_validator.py tagged.csv [--samples 5] [--json report.json]
+"""
+
+import argparse
+import csv
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tag_vocab import table_tags, tag_dimension
+
+LEGACY_PREFIXES = ('c:', 'f:', 'b:', 'sc:')
+LEGACY_TAGS = frozenset({'made-in-usa'})
+
+# Closed dimensions: the values the spec lists
+SPEC_VALUES = {
+    'pillar': {'smokeshop-device', 'accessory', 'packaging', 'merch'},
+    'family': {
+        'glass-bong', 'silicone-bong', 'glass-rig', 'silicone-rig', 'bubbler', 'joint-bubbler',
+        'spoon-pipe', 'chillum-onehitter', 'nectar-collector', 'flower-bowl', 'carb-cap', 'banger',
+        'dab-tool', 'grinder', 'rolling-paper', 'tray', 'torch', 'ash-catcher', 'downstem',
+        'rolling-accessory', 'storage-accessory', 'vape-battery', 'vape-coil',
+        'electronic-nectar-collector', 'merch-pendant',
+    },
+    'material': {
+        'glass', 'borosilicate', 'quartz', 'silicone', 'metal', 'stainless-steel', 'titanium',
+        'ceramic', 'wood', 'stone', 'acrylic', 'plastic', 'hybrid',
+    },
+    'format': {
+        'bong', 'rig', 'pipe', 'bubbler', 'nectar-collector', 'banger', 'cap', 'tool', 'grinder',
+        'torch', 'paper', 'tray', 'jar', 'box', 'coil', 'battery-mod', 'accessory', 'pendant',
+    },
+    'use': {'flower-smoking', 'dabbing', 'multi-use', 'rolling', 'setup-protection', 'storage',
+            'preparation'},
+    'joint_size': {'10mm', '14mm', '18mm'},
+    'joint_angle': {'45', '90'},
+    'joint_gender': {'male', 'female'},
+}
+
+_SLUG = r'[a-z0-9]+(?:-[a-z0-9]+)*'
+
+# Open dimensions: the pattern the spec gives for their values
+SPEC_PATTERNS = {
+    'brand': _SLUG,
+    'length': r'\d+(?:\.\d+)?in',
+    'capacity': r'\d+(?:\.\d+)?(?:ml|oz)',
+    # The spec lists common styles but allows others
+    'style': _SLUG,
+    'bundle': r'single|\d+-pack|display-box|bulk-case',
+}
+
+# Dimension -> (fewest, most) tags a product may carry
+SPEC_CARDINALITY = {
+    'pillar': (1, 1),
+    'family': (1, 1),
+    'format': (1, 1),
+    'brand': (0, 1),
+}
+
+# Handles kept per rule for the report
+DEFAULT_SAMPLES = 5
+
+
+def _tag_rule(tag: str, values: Dict[str, frozenset], patterns: Dict[str, re.Pattern]) -> Optional[str]:
+    """The rule tag breaks on its own, or None if it is a valid spec tag."""
+    if tag in LEGACY_TAGS or tag.startswith(LEGACY_PREFIXES):
+        return 'legacy-tag'
+    if ',' in tag or tag != tag.strip():
+        return 'malformed-tag'
+    dimension = tag_dimension(tag)
+    value = tag[len(dimension) + 1:]
+    if dimension in values:
+        return None if value in values[dimension] else f'unknown-{dimension}'
+    if dimension in patterns:
+        return None if patterns[dimension].fullmatch(value) else f'malformed-{dimension}'
+    return 'unknown-dimension'
+
+
+class TagValidator:
+    """Checks products' tags against a compiled spec schema and tallies violations."""
+
+    def __init__(self, tables: Iterable = (), samples: int = DEFAULT_SAMPLES):
+        values = {dimension: set(allowed) for dimension, allowed in SPEC_VALUES.items()}
+        # Whatever the rule tables emit for a closed dimension is allowed too
+        for table in tables:
+            for tag in table_tags(table):
+                dimension = tag_dimension(tag)
+                if dimension in values:
+                    values[dimension].add(tag[len(dimension) + 1:])
+        self.values = {dimension: frozenset(allowed) for dimension, allowed in values.items()}
+        self.patterns = {dimension: re.compile(pattern) for dimension, pattern in SPEC_PATTERNS.items()}
+        self.samples = samples
+        self.checked = 0
+        self.invalid = 0
+        self.violations = {}
+        self.examples = {}
+        # tag -> (dimension counted for cardinality or None, rule broken or None)
+        self._verdicts = {}
+
+    def _verdict(self, tag: str) -> Tuple[Optional[str], Optional[str]]:
+        dimension = tag_dimension(tag)
+        verdict = (dimension if dimension in SPEC_CARDINALITY else None,
+                   _tag_rule(tag, self.values, self.patterns))
+        self._verdicts[tag] = verdict
+        return verdict
+
+    def check(self, handle: str, tags: Iterable[str]) -> List[str]:
+        """Validate one product's tags; returns the rules it broke (empty if none)."""
+        verdicts = self._verdicts
+        counts = dict.fromkeys(SPEC_CARDINALITY, 0)
+        broken = []
+        for tag in tags:
+            verdict = verdicts.get(tag) or self._verdict(tag)
+            if verdict[0] is not None:
+                counts[verdict[0]] += 1
+            if verdict[1] is not None and verdict[1] not in broken:
+                broken.append(verdict[1])
+        for dimension, count in counts.items():
+            fewest, most = SPEC_CARDINALITY[dimension]
+            if count < fewest:
+                broken.append(f'missing-{dimension}')
+            elif count > most:
+                broken.append(f'multiple-{dimension}')
+
+        self.checked += 1
+        if broken:
+            self.invalid += 1
+            for rule in broken:
+                self.violations[rule] = self.violations.get(rule, 0) + 1
+                examples = self.examples.setdefault(rule, [])
+                if len(examples) < self.samples:
+                    examples.append(handle)
+        return broken
+
+    def summary(self) -> str:
+        lines = [f"Validation: {self.invalid} of {self.checked} products break the tag spec"]
+        for rule, count in sorted(self.violations.items(), key=lambda item: (-item[1], item[0])):
+            lines.append(f"  {rule:<24} {count:<8} e.g. {', '.join(self.examples[rule])}")
+        return '\n'.join(lines)
+
+    def to_dict(self) -> Dict:
+        return {'checked': self.checked, 'invalid': self.invalid,
+                'violations': dict(self.violations), 'examples': dict(self.examples)}
+
+
+def validate_csv(path: str, validator: TagValidator) -> TagValidator:
+    """Run every tagged in-scope product row of a tagged export through validator."""
+    # generate_tags imports this module, so its names are only imported here
+    from generate_tags import is_in_scope_vendor
+    from tag_delta import parse_tags
+
+    with open(path, 'r', encoding='utf-8', newline='') as handle:
+        for row in csv.DictReader(handle):
+            if row.get('Title', '') and is_in_scope_vendor(row.get('Vendor', '')):
+                validator.check(row.get('Handle', ''), parse_tags(row.get('Tags', '')))
+    return validator
+
+
+def main(argv: Optional[List[str]] = None):
+    from generate_tags import FAMILY_PROFILES, TYPE_MAPPING
+
+    parser = argparse.ArgumentParser(description="Check a tagged export against the tag spec.")
+    parser.add_argument('input', help='tagged Shopify CSV written by generate_tags.py')
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES,
+                        help='offending handles listed per rule (default: %(default)s)')
+    parser.add_argument('--json', metavar='PATH', help='also write the report to PATH as JSON')
+    args = parser.parse_args(argv)
+
+    validator = validate_csv(args.input, TagValidator((TYPE_MAPPING, FAMILY_PROFILES), args.samples))
+    print(validator.summary())
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as handle:
+            json.dump(validator.to_dict(), handle, indent=2)
+        print(f"Report written to: {args.json}")
+    return 1 if validator.invalid else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
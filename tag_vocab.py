@@ -0,0 +1,192 @@
+"""
+Interned tag vocabulary and compact tag sets.
+
+Every distinct tag string gets a small integer id, the first time it is
+seen, and a single canonical string object. A TagSet stores a product's
+tags as a bitset of those ids (a Python int) plus the ids in insertion
+order, so membership, equality and differences are a few word operations,
+and the tag strings themselves exist once per vocabulary however many
+products carry them.
+
+Ids are only meaningful within one vocabulary in one process; anything
+that crosses a process or file boundary goes as tag strings.
+
+Only id(), and so TagSet, adds tags to a vocabulary. intern() and unique()
+hand back the vocabulary's copy of tags it already holds and pass others
+through, so a long-lived vocabulary seeded from the rule tables does not
+grow with every free-form value (lengths, pack counts) it is shown.
+"""
+
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+def tag_dimension(tag: str) -> str:
+    dimension, separator, _ = tag.partition(':')
+    return dimension if separator else '(untyped)'
+
+
+def table_tags(table) -> Iterator[str]:
+    """Every 'dimension:value' string among the values of a nested rule table."""
+    if isinstance(table, str):
+        if ':' in table:
+            yield table
+    elif isinstance(table, dict):
+        for value in table.values():
+            yield from table_tags(value)
+    elif isinstance(table, (list, tuple)):
+        for value in table:
+            yield from table_tags(value)
+
+
+class TagVocabulary:
+    """Two-way mapping between tag strings and small integer ids."""
+
+    def __init__(self, tags: Iterable[str] = ()):
+        self._ids = {}
+        self._tags = []
+        self._dimensions = []
+        self._lock = threading.Lock()
+        for tag in tags:
+            self.id(tag)
+
+    @classmethod
+    def from_tables(cls, *tables) -> 'TagVocabulary':
+        """A vocabulary seeded with every tag that appears in the given rule tables."""
+        return cls(tag for table in tables for tag in table_tags(table))
+
+    def id(self, tag: str) -> int:
+        """The id of tag, assigning the next free one if it is new."""
+        tag_id = self._ids.get(tag)
+        if tag_id is None:
+            with self._lock:
+                tag_id = self._ids.get(tag)
+                if tag_id is None:
+                    tag_id = len(self._tags)
+                    self._tags.append(tag)
+                    self._dimensions.append(tag_dimension(tag))
+                    self._ids[tag] = tag_id
+        return tag_id
+
+    def intern(self, tag: str) -> str:
+        """The vocabulary's own copy of tag, or tag itself if it is not in the vocabulary."""
+        tag_id = self._ids.get(tag)
+        return tag if tag_id is None else self._tags[tag_id]
+
+    def unique(self, tags: Iterable[str]) -> List[str]:
+        """tags in order without empties or repeats, known ones as the vocabulary's strings."""
+        known = self._ids
+        interned = self._tags
+        seen = set()
+        unique_tags = []
+        for tag in tags:
+            if tag and tag not in seen:
+                seen.add(tag)
+                tag_id = known.get(tag)
+                unique_tags.append(tag if tag_id is None else interned[tag_id])
+        return unique_tags
+
+    def tag(self, tag_id: int) -> str:
+        return self._tags[tag_id]
+
+    def dimension(self, tag_id: int) -> str:
+        """The part of the tag before ':', or '(untyped)'."""
+        return self._dimensions[tag_id]
+
+    def get(self, tag: str) -> Optional[int]:
+        """The id of tag, or None if it was never seen."""
+        return self._ids.get(tag)
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self._ids
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+
+class TagSet:
+    """An insertion-ordered set of tags from one vocabulary."""
+
+    __slots__ = ('vocabulary', 'bits', 'ids')
+
+    def __init__(self, vocabulary: TagVocabulary, tags: Iterable[str] = ()):
+        self.vocabulary = vocabulary
+        self.bits = 0
+        self.ids = array('I')
+        self.update(tags)
+
+    def add(self, tag: str) -> bool:
+        """Add tag; returns False if it was already in the set."""
+        tag_id = self.vocabulary.id(tag)
+        bit = 1 << tag_id
+        if self.bits & bit:
+            return False
+        self.bits |= bit
+        self.ids.append(tag_id)
+        return True
+
+    def update(self, tags: Iterable[str]):
+        # add() inlined: this builds every product's tags
+        known = self.vocabulary._ids
+        assign = self.vocabulary.id
+        bits = self.bits
+        ids = self.ids
+        for tag in tags:
+            tag_id = known.get(tag)
+            if tag_id is None:
+                tag_id = assign(tag)
+            if not bits >> tag_id & 1:
+                bits |= 1 << tag_id
+                ids.append(tag_id)
+        self.bits = bits
+
+    def names(self) -> List[str]:
+        """The tags in insertion order, as the vocabulary's interned strings."""
+        return list(map(self.vocabulary._tags.__getitem__, self.ids))
+
+    def difference(self, other: 'TagSet') -> List[str]:
+        """Tags in this set but not in other, in insertion order."""
+        missing = self.bits & ~other.bits
+        if not missing:
+            return []
+        tag = self.vocabulary.tag
+        return [tag(tag_id) for tag_id in self.ids if missing >> tag_id & 1]
+
+    def dimension_counts(self, other: 'TagSet') -> Dict[str, int]:
+        """Per dimension, how many tags of this set are not in other."""
+        counts = {}
+        missing = self.bits & ~other.bits
+        dimension = self.vocabulary.dimension
+        for tag_id in self.ids:
+            if missing >> tag_id & 1:
+                name = dimension(tag_id)
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def isdisjoint(self, other: 'TagSet') -> bool:
+        return not self.bits & other.bits
+
+    def issubset(self, other: 'TagSet') -> bool:
+        return not self.bits & ~other.bits
+
+    def __contains__(self, tag: str) -> bool:
+        tag_id = self.vocabulary.get(tag)
+        return tag_id is not None and bool(self.bits >> tag_id & 1)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __eq__(self, other) -> bool:
+        """Same tags, in any order (both sets must share a vocabulary)."""
+        if not isinstance(other, TagSet):
+            return NotImplemented
+        return self.bits == other.bits
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'TagSet({self.names()!r})'
@@ -0,0 +1,16 @@
+import pytest
+
+from generate_tags import generate_tags_for_columns, generate_tags_for_product
+
+
+def test_columns_accept_pandas_nullable_strings():
+    pd = pytest.importorskip('pandas')
+    titles = pd.Series(['Glass Bong', pd.NA], dtype='string')
+    bodies = pd.Series([pd.NA, '<p>14mm male</p>'], dtype='string')
+    types = pd.Series(['bongs & water pipes', pd.NA], dtype='string')
+    vendors = pd.Series(['What You Need', 'What You Need'], dtype='string')
+
+    assert generate_tags_for_columns(titles, bodies, types, vendors) == [
+        generate_tags_for_product('', 'Glass Bong', '', 'bongs & water pipes', 'What You Need', ''),
+        generate_tags_for_product('', '', '<p>14mm male</p>', '', 'What You Need', ''),
+    ]
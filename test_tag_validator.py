@@ -0,0 +1,25 @@
+import csv
+import json
+
+import tag_validator
+
+
+def test_main_writes_json_report(tmp_path):
+    tagged = tmp_path / 'tagged.csv'
+    with open(tagged, 'w', encoding='utf-8', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['Handle', 'Title', 'Vendor', 'Tags'])
+        writer.writerow(['good', 'Glass Bong', 'What You Need',
+                         'pillar:smokeshop-device, family:glass-bong, material:glass, format:bong'])
+        writer.writerow(['legacy', 'Glass Pipe', 'What You Need',
+                         'pillar:smokeshop-device, family:spoon-pipe, format:pipe, c:pipes'])
+        writer.writerow(['legacy', '', '', ''])
+    report = tmp_path / 'report.json'
+
+    assert tag_validator.main([str(tagged), '--json', str(report)]) == 1
+    assert json.loads(report.read_text(encoding='utf-8')) == {
+        'checked': 2,
+        'invalid': 1,
+        'violations': {'legacy-tag': 1},
+        'examples': {'legacy-tag': ['legacy']},
+    }